@@ -0,0 +1,40 @@
+"""Headless batch version of Base Code.py: every scheme against its own benchmark.
+
+The loaders and the join live in core.active_weights; this is only the command line.
+
+Usage:
+    python batch_active_weights.py schemes.csv benchmarks.csv -o active_weights
+    python batch_active_weights.py schemes.csv benchmarks.csv -o active_weights.xlsx --workers 8
+"""
+import argparse
+import logging
+import os
+
+from core.active_weights import load_benchmark_holdings, load_scheme_holdings, run_batch, write_output
+from core.security_master import SecurityMaster
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scheme vs benchmark active weights for every scheme.")
+    parser.add_argument("schemes", help="Path to schemes.csv")
+    parser.add_argument("benchmarks", help="Path to benchmarks.csv")
+    parser.add_argument("-o", "--output", default="active_weights",
+                        help="Parquet dataset directory (partitioned by benchmark) or .xlsx workbook")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Process pool size")
+    parser.add_argument("--default-benchmark", help="Benchmark for schemes with none in column 25")
+    args = parser.parse_args(argv)
+    # core.active_weights reports skipped schemes through logging; show them on stderr
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+
+    master = SecurityMaster()
+    scheme_holdings = load_scheme_holdings(args.schemes, args.default_benchmark, master)
+    benchmark_holdings = load_benchmark_holdings(args.benchmarks, master)
+    master.save()
+    result = run_batch(scheme_holdings, benchmark_holdings, workers=args.workers)
+    write_output(result, args.output)
+    print(f"Wrote {len(result)} rows for {result['Scheme'].nunique()} schemes "
+          f"({result['Benchmark'].nunique()} benchmarks) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Synthetic inputs shaped like the real uploads, for benchmarking.
+
+schemes.csv has one title line (main.py / test1.py read it with skiprows=1) and keeps Base Code.py's
+positions: scheme name in column 3, ticker in column 5, holding % in column 10, benchmark in column 25.
+benchmarks.csv has two title lines (skiprows=2) with the stock in column 4, index name in column 5
+and weight in column 10. The dealer workbook has the columns dash.py expects on every sheet.
+
+    python -m bench.generate --rows 100000 --out /tmp/bench-data
+"""
+import argparse
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCHEME_COLUMNS = ['Fund House', 'Category', 'Scheme Name', 'ISIN', 'Security Name', 'Industry',
+                  'Quantity', 'Market Value (Cr)', 'Rating', '% of Holdings', 'Benchmark Weight',
+                  'Active Weight'] + [f'Field {i}' for i in range(12, 24)] + ['Benchmark']
+BENCHMARK_COLUMNS = ['Date', 'Exchange', 'ISIN', 'Security Name', 'Index Name',
+                     'Sector', 'Close', 'Shares', 'Market Cap', 'Weight (%)']
+INDICES = ['NIFTY500', 'NIFTY50', 'BSE500', 'NIFTY MIDCAP 150', 'NIFTY SMALLCAP 250']
+INDUSTRIES = ['Banks', 'IT - Software', 'Pharmaceuticals', 'Automobiles', 'Cement', 'Power',
+              'Petroleum Products', 'Finance', 'Consumer Durables', 'Telecom', 'Chemicals', 'Retailing']
+CITIES = {'Mumbai': (19.07, 72.88), 'Pune': (18.52, 73.86), 'Delhi': (28.61, 77.21),
+          'Bengaluru': (12.97, 77.59), 'Chennai': (13.08, 80.27), 'Kolkata': (22.57, 88.36),
+          'Hyderabad': (17.39, 78.49), 'Ahmedabad': (23.02, 72.57)}
+COMPANIES = ['Tata Motors', 'Mahindra', 'Maruti Suzuki', 'Hero MotoCorp', 'Bajaj Auto', 'Ashok Leyland']
+SECTORS = ['Automotive', 'Two Wheeler', 'Commercial Vehicles', 'Tractors']
+POSITIONS = ['Owner', 'General Manager', 'Sales Manager', 'Service Manager']
+
+
+def _stocks(count):
+    return np.array([f'SECURITY {i:05d} LTD' for i in range(count)], dtype=object)
+
+
+def holdings_frames(rows, holdings_per_scheme=60, seed=0):
+    """(schemes, benchmarks) frames with about ``rows`` scheme holdings.
+
+    Text columns of the schemes frame are categoricals built from integer codes, so 10M rows
+    stay within a few GB.
+    """
+    rng = np.random.default_rng(seed)
+    schemes = max(1, rows // holdings_per_scheme)
+    stocks = _stocks(max(2000, holdings_per_scheme * 4))
+
+    scheme_ids = np.repeat(np.arange(schemes), holdings_per_scheme)[:rows]
+    stock_ids = rng.integers(0, len(stocks), len(scheme_ids))
+    n = len(scheme_ids)
+    fund_weight = rng.gamma(1.5, 1.1, n).round(2)
+    benchmark_weight = rng.gamma(1.2, 0.5, n).round(2)
+    blank = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [''])
+    columns = {
+        'Fund House': pd.Categorical.from_codes(scheme_ids % 40, [f'AMC {i}' for i in range(40)]),
+        'Category': pd.Categorical.from_codes(rng.integers(0, 4, n), ['Large Cap', 'Mid Cap', 'Flexi Cap', 'Small Cap']),
+        'Scheme Name': pd.Categorical.from_codes(scheme_ids, [f'Scheme {i:05d} Fund(G)' for i in range(schemes)]),
+        'ISIN': pd.Categorical.from_codes(stock_ids, [f'INE{i + 100000}' for i in range(len(stocks))]),
+        'Security Name': pd.Categorical.from_codes(stock_ids, stocks),
+        'Industry': pd.Categorical.from_codes(stock_ids % len(INDUSTRIES), INDUSTRIES),
+        'Quantity': rng.integers(100, 10_000_000, n),
+        'Market Value (Cr)': rng.gamma(2, 50, n).round(2),
+        'Rating': blank,
+        '% of Holdings': fund_weight,
+        'Benchmark Weight': benchmark_weight,
+        'Active Weight': (fund_weight - benchmark_weight).round(2),
+    }
+    for name in SCHEME_COLUMNS[12:24]:
+        columns[name] = blank
+    columns['Benchmark'] = pd.Categorical.from_codes(scheme_ids % len(INDICES), INDICES)
+    schemes_df = pd.DataFrame(columns, columns=SCHEME_COLUMNS)
+
+    parts = []
+    for i, index_name in enumerate(INDICES):
+        members = rng.choice(len(stocks), size=min(500, len(stocks)), replace=False)
+        weights = rng.gamma(1.0, 1.0, len(members))
+        parts.append(pd.DataFrame({
+            'Date': '2025-01-31', 'Exchange': 'NSE', 'ISIN': np.char.add('INE', (members + 100000).astype(str)),
+            'Security Name': stocks[members], 'Index Name': index_name, 'Sector': '',
+            'Close': rng.gamma(2, 500, len(members)).round(2), 'Shares': rng.integers(1e6, 1e9, len(members)),
+            'Market Cap': rng.gamma(2, 1e4, len(members)).round(2),
+            'Weight (%)': (100 * weights / weights.sum()).round(4),
+        }, columns=BENCHMARK_COLUMNS))
+    return schemes_df, pd.concat(parts, ignore_index=True)
+
+
+def to_csv_bytes(df, title_lines):
+    """CSV bytes after ``title_lines`` title lines; written by pyarrow (already needed for Parquet),
+    which is about 10x faster than DataFrame.to_csv at millions of rows. The data is ASCII."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    buffer = BytesIO()
+    for i in range(title_lines):
+        buffer.write(f"Synthetic disclosure report line {i + 1}\n".encode("ISO-8859-1"))
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer,
+                     pa_csv.WriteOptions(quoting_style="needed"))
+    return buffer.getvalue()
+
+
+def holdings_csvs(rows, seed=0, benchmark_title_lines=2):
+    """(schemes.csv bytes, benchmarks.csv bytes) with the title lines the apps skip."""
+    schemes_df, benchmarks_df = holdings_frames(rows, seed=seed)
+    return to_csv_bytes(schemes_df, 1), to_csv_bytes(benchmarks_df, benchmark_title_lines)
+
+
+def dealer_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    cities = list(CITIES)
+    city = rng.integers(0, len(cities), rows)
+    centre = np.array([CITIES[c] for c in cities])[city]
+    place = rng.integers(0, 25, rows)
+    return pd.DataFrame({
+        'Name': [f'Dealer {i}' for i in range(rows)],
+        'Company': rng.choice(COMPANIES, rows),
+        'Location': np.array(cities, dtype=object)[city],
+        'Place': [f'{cities[c]} Area {p}' for c, p in zip(city, place)],
+        'Latitude': (centre[:, 0] + rng.normal(0, 0.08, rows)).round(6),
+        'Longitude': (centre[:, 1] + rng.normal(0, 0.08, rows)).round(6),
+        'Email Address': [f'dealer{i}@example.com' for i in range(rows)],
+        'Linkedin Link': '',
+        'Phone Number': rng.integers(7_000_000_000, 9_999_999_999, rows),
+        'Position': rng.choice(POSITIONS, rows),
+        'Sector': rng.choice(SECTORS, rows),
+        'Photo': '',
+    })
+
+
+def dealer_workbook(rows, sheets=4, seed=0):
+    """.xlsx bytes with ``rows`` dealers split across ``sheets`` sheets."""
+    df = dealer_frame(rows, seed=seed)
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        for i, part in enumerate(np.array_split(np.arange(rows), sheets)):
+            df.iloc[part].to_excel(writer, index=False, sheet_name=f'Dealer Type {i + 1}')
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic schemes.csv, benchmarks.csv and dealers.xlsx.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Scheme holding rows")
+    parser.add_argument("--dealers", type=int, default=20_000, help="Dealer rows in the workbook")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--out", default=".", help="Output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    schemes_csv, benchmarks_csv = holdings_csvs(args.rows, seed=args.seed)
+    (out / "schemes.csv").write_bytes(schemes_csv)
+    (out / "benchmarks.csv").write_bytes(benchmarks_csv)
+    (out / "dealers.xlsx").write_bytes(dealer_workbook(args.dealers, args.sheets, seed=args.seed))
+    print(f"Wrote schemes.csv, benchmarks.csv and dealers.xlsx to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Time the hot paths of main.py, test1.py, Base Code.py and dash.py on synthetic data.
+
+Each stage runs against inputs from bench.generate at every requested size and the best of
+``--repeat`` runs is recorded. Stages with super-linear cost (Excel writing, the distance matrix,
+route solving, PDF pages) are capped at STAGE_CAPS rows so large sizes stay runnable.
+
+    python -m bench.run --sizes 10k,100k,1m -o bench_results.json
+    python -m bench.run --sizes 10k,100k --baseline bench_results.json
+
+With ``--baseline`` every stage is compared against the same stage and size in an earlier results
+file; a stage is a regression when it is slower than the baseline by more than its tolerance in
+bench/thresholds.json and by more than ``min_delta_seconds``. Regressions exit with status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench.generate import dealer_workbook, holdings_frames, to_csv_bytes
+from core.active_weights import load_benchmark_holdings, load_scheme_holdings, run_batch, write_output
+from core.dealer_map import ClusterPyramid
+from core.dealers import FilterIndex, load_sheets, workbook_sheet_names
+from core.exports import contacts_pdf, csv_bytes, excel_bytes
+from core.frame_cache import FrameCache
+from core.holdings import (all_schemes_report_sheets, build_scheme_index, read_csv_chunked, read_header,
+                           read_schemes, scheme_report_sheets)
+from core.overlap import HoldingsMatrix, stock_key
+from core.routing import distance_matrix, solve_route
+from core.security_master import SecurityMaster
+
+THRESHOLDS_PATH = Path(__file__).with_name("thresholds.json")
+# Row caps for stages whose cost does not scale linearly with the input
+STAGE_CAPS = {
+    'excel_report': 100_000,
+    'excel_all_schemes': 200_000,
+    'workbook_load': 200_000,
+    'workbook_load_cached': 200_000,
+    'filter_index': 1_000_000,
+    'filter_select': 1_000_000,
+    'distance_matrix': 5_000,
+    'route_fast': 300,
+    'route_christofides': 200,
+    'pdf': 20_000,
+}
+ROUTE_TIME_BUDGET = 0.5
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def best_of(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+class Suite:
+    def __init__(self, size, repeat, stages=None):
+        self.size = size
+        self.repeat = repeat
+        self.stages = stages
+        self.results = {}
+
+    def wanted(self, name):
+        return self.stages is None or name in self.stages
+
+    def rows(self, name):
+        return min(self.size, STAGE_CAPS.get(name, self.size))
+
+    def time(self, name, fn, rows=None, repeat=None, **extra):
+        """Record the best wall time of ``fn`` under ``name`` and return its last result."""
+        seconds, result = best_of(fn, repeat or self.repeat)
+        self.results[name] = {'seconds': round(seconds, 6), 'rows': rows or self.size, **extra}
+        print(f"  {name:<22} {seconds:9.3f}s  ({rows or self.size:,} rows)", flush=True)
+        return result
+
+
+def holdings_stages(suite, workdir):
+    size = suite.size
+    # generated once; every stage reads these frames or the CSV bytes written from them
+    schemes_frame, benchmarks_frame = holdings_frames(size)
+    schemes_csv = to_csv_bytes(schemes_frame, title_lines=1)
+
+    # main.py: detected columns only, names categorical, weights float32
+    schemes_df = suite.time('ingest_schemes', lambda: read_schemes(schemes_csv, skiprows=1, encoding='ISO-8859-1'))
+    if suite.wanted('scheme_index'):
+        scheme_index = suite.time('scheme_index', lambda: build_scheme_index(schemes_df),
+                                  schemes=schemes_df['Scheme Name'].nunique())
+    else:
+        scheme_index = build_scheme_index(schemes_df)
+
+    # test1.py: header first, then only the picked columns
+    def ingest_columns():
+        cols = read_header(schemes_csv, skiprows=1, encoding='ISO-8859-1')
+        return read_csv_chunked(schemes_csv, usecols=[cols[2], cols[4], cols[9]], categorical=[cols[2], cols[4]],
+                                numeric=[cols[9]], skiprows=1, encoding='ISO-8859-1')
+    if suite.wanted('ingest_columns'):
+        suite.time('ingest_columns', ingest_columns)
+
+    # test1.py / batch engine: stock names to security IDs through an empty (cold) security master;
+    # new IDs are saved as they are created, so each repeat gets its own directory
+    if suite.wanted('security_ids'):
+        suite.time('security_ids', lambda: SecurityMaster(tempfile.mkdtemp(dir=workdir)).ids(schemes_df['Stock Name']),
+                   securities=schemes_df['Stock Name'].nunique())
+
+    if suite.wanted('excel_report'):
+        summary = next(iter(scheme_index.values()))
+        suite.time('excel_report', lambda: excel_bytes(scheme_report_sheets(summary)),
+                   rows=sum(len(df) for _, df in scheme_report_sheets(summary)))
+    if suite.wanted('excel_all_schemes'):
+        schemes = list(scheme_index)[:max(1, suite.rows('excel_all_schemes') // 60)]
+        subset = {scheme: scheme_index[scheme] for scheme in schemes}
+        suite.time('excel_all_schemes', lambda: excel_bytes(all_schemes_report_sheets(subset)),
+                   rows=int(schemes_df['Scheme Name'].isin(schemes).sum()), repeat=1)
+
+    # test1.py all-schemes comparison: sparse matrix, active share against every benchmark, overlap
+    if any(suite.wanted(name) for name in ('holdings_matrix', 'active_share', 'overlap')):
+        matrix = suite.time('holdings_matrix', lambda: HoldingsMatrix(
+            schemes_frame['Scheme Name'], stock_key(schemes_frame['Security Name']), schemes_frame['% of Holdings'],
+            normalize=True))
+        suite.time('active_share', lambda: matrix.active_share_table(
+            benchmarks_frame['Index Name'], stock_key(benchmarks_frame['Security Name']), benchmarks_frame['Weight (%)'],
+            normalize=True), schemes=len(matrix.schemes))
+        suite.time('overlap', matrix.overlap, repeat=1, schemes=len(matrix.schemes))
+
+    # Base Code.py / batch engine: benchmarks.csv with the three title lines it skips
+    if any(suite.wanted(name) for name in ('batch_active_weights', 'export_csv', 'export_parquet')):
+        schemes_path, benchmarks_path = Path(workdir, 'schemes.csv'), Path(workdir, 'benchmarks.csv')
+        schemes_path.write_bytes(schemes_csv)
+        benchmarks_path.write_bytes(to_csv_bytes(benchmarks_frame, title_lines=3))
+        master = SecurityMaster(Path(workdir, 'security_master'))
+        scheme_holdings = suite.time('batch_ingest', lambda: load_scheme_holdings(schemes_path, master=master), repeat=1)
+        benchmark_holdings = load_benchmark_holdings(benchmarks_path, master=master)
+        result = suite.time('batch_active_weights', lambda: run_batch(scheme_holdings, benchmark_holdings, workers=1),
+                            repeat=1)
+        if suite.wanted('export_csv'):
+            suite.time('export_csv', lambda: csv_bytes(result), rows=len(result), repeat=1)
+        if suite.wanted('export_parquet'):
+            target = Path(workdir, 'active_weights')
+            suite.time('export_parquet', lambda: write_output(result, str(target)), rows=len(result), repeat=1)
+
+
+def dealer_stages(suite, workdir):
+    rows = suite.rows('workbook_load')
+    data = dealer_workbook(rows)
+    sheets = workbook_sheet_names(data)
+    cache = FrameCache(Path(workdir, 'frames'))
+
+    def cold_load():
+        # a fresh cache directory each run, so every sheet goes through openpyxl
+        return load_sheets(data, sheets, cache=FrameCache(tempfile.mkdtemp(dir=workdir)))
+    if suite.wanted('workbook_load'):
+        suite.time('workbook_load', cold_load, rows=rows, repeat=1)
+    frames = load_sheets(data, sheets, cache=cache)
+    suite.time('workbook_load_cached', lambda: load_sheets(data, sheets, cache=cache), rows=rows)
+    df = pd.concat(list(frames.values()), ignore_index=True)
+
+    index = suite.time('filter_index', lambda: FilterIndex(df), rows=len(df))
+    company, location = index.options['Company'][0], index.options['Location'][0]
+    suite.time('filter_select', lambda: index.select(name='dealer 1', Company=[company], Location=[location]),
+               rows=len(df))
+
+    # dash.py map: per-zoom cell codes once per sheet, then a cluster count per filter
+    pyramid = suite.time('cluster_pyramid', lambda: ClusterPyramid(df['Latitude'], df['Longitude']), rows=len(df))
+    mask = index.mask(Location=[location])
+    suite.time('map_clusters', lambda: pyramid.clusters(pyramid.fit_zoom(mask), mask), rows=len(df))
+
+    n = min(len(df), suite.rows('distance_matrix'))
+    lat, lon = df['Latitude'].to_numpy()[:n], df['Longitude'].to_numpy()[:n]
+    suite.time('distance_matrix', lambda: distance_matrix(lat, lon), rows=n)
+
+    for name, solver in (('route_fast', 'fast'), ('route_christofides', 'christofides')):
+        if not suite.wanted(name):
+            continue
+        if solver == 'christofides':
+            try:
+                import networkx  # noqa: F401
+            except ImportError:
+                print(f"  {name:<22} skipped (networkx not installed)")
+                continue
+        n = min(len(df), suite.rows(name))
+        dist = distance_matrix(df['Latitude'].to_numpy()[:n], df['Longitude'].to_numpy()[:n])
+        path, route_km, _ = suite.time(name, lambda: solve_route(dist, solver, ROUTE_TIME_BUDGET), rows=n, repeat=1)
+        suite.results[name]['distance_km'] = round(float(route_km), 3)
+
+    if suite.wanted('pdf'):
+        n = min(len(df), suite.rows('pdf'))
+        suite.time('pdf', lambda: contacts_pdf(df.iloc[:n]), rows=n, repeat=1)
+
+
+def run(sizes, repeat=3, stages=None, groups=('holdings', 'dealers')):
+    results = {}
+    for size in sizes:
+        print(f"size {size:,}", flush=True)
+        suite = Suite(size, repeat, stages)
+        with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+            if 'holdings' in groups:
+                holdings_stages(suite, workdir)
+            if 'dealers' in groups:
+                dealer_stages(suite, workdir)
+        if stages is not None:
+            suite.results = {name: value for name, value in suite.results.items() if name in stages}
+        results[str(size)] = suite.results
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, baseline, thresholds):
+    """Return [(size, stage, seconds, baseline seconds, tolerance)] for stages that regressed."""
+    regressions = []
+    min_delta = thresholds.get('min_delta_seconds', 0.0)
+    for size, stages in current['results'].items():
+        for stage, result in stages.items():
+            base = baseline['results'].get(size, {}).get(stage)
+            if base is None:
+                continue
+            tolerance = thresholds.get('stages', {}).get(stage, thresholds['default_tolerance'])
+            seconds, base_seconds = result['seconds'], base['seconds']
+            if seconds > base_seconds * tolerance and seconds - base_seconds > min_delta:
+                regressions.append((size, stage, seconds, base_seconds, tolerance))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the holdings and dealer pipelines on synthetic data.")
+    parser.add_argument("--sizes", default="10k,100k", help="Comma-separated row counts, e.g. 10k,100k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best time is kept")
+    parser.add_argument("--stages", help="Comma-separated stage names to report (default: all)")
+    parser.add_argument("--only", choices=['holdings', 'dealers'], help="Run one group of stages")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="Results JSON path")
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_PATH), help="Tolerance JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    stages = set(args.stages.split(',')) if args.stages else None
+    groups = (args.only,) if args.only else ('holdings', 'dealers')
+    current = run(sizes, repeat=args.repeat, stages=stages, groups=groups)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, load_thresholds(args.thresholds))
+        for size, stage, seconds, base_seconds, tolerance in regressions:
+            print(f"REGRESSION {stage} @ {int(size):,} rows: {seconds:.3f}s vs {base_seconds:.3f}s "
+                  f"(allowed x{tolerance})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Shared analytics engines for the Streamlit apps, Base Code.py, the batch CLI and the benchmarks.
+
+Plain functions and classes with no Streamlit dependency at import time; optional heavy
+libraries (networkx, openpyxl, reportlab) are imported inside the functions that need them.
+"""
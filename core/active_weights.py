@@ -0,0 +1,116 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.exports import write_excel
+from core.holdings import read_csv_chunked, read_header
+from core.security_master import SecurityMaster
+
+# Column positions of the raw schemes.csv / benchmarks.csv exports (Base Code.py and the batch CLI)
+SCHEME_NAME_POS, SCHEME_STOCK_POS, SCHEME_WEIGHT_POS, SCHEME_BENCHMARK_POS = 2, 4, 9, 24
+BENCHMARK_STOCK_POS, BENCHMARK_NAME_POS, BENCHMARK_WEIGHT_POS = 3, 4, 9
+
+logger = logging.getLogger(__name__)
+
+
+def load_scheme_holdings(path, default_benchmark=None, master=None):
+    master = SecurityMaster() if master is None else master
+    cols = read_header(path, skiprows=1, encoding="ISO-8859-1")
+    schemes_df = read_csv_chunked(
+        path, usecols=[cols[SCHEME_NAME_POS], cols[SCHEME_STOCK_POS], cols[SCHEME_WEIGHT_POS], cols[SCHEME_BENCHMARK_POS]],
+        categorical=[cols[SCHEME_NAME_POS], cols[SCHEME_STOCK_POS], cols[SCHEME_BENCHMARK_POS]],
+        numeric=[cols[SCHEME_WEIGHT_POS]], skiprows=1, encoding="ISO-8859-1")
+    holdings = pd.DataFrame({
+        'Scheme': schemes_df[cols[SCHEME_NAME_POS]].astype(str).str.strip(),
+        'Benchmark': schemes_df[cols[SCHEME_BENCHMARK_POS]],
+        'Stock': schemes_df[cols[SCHEME_STOCK_POS]].astype(str).str.strip().str.upper(),
+        'Security ID': master.ids(schemes_df[cols[SCHEME_STOCK_POS]]),
+        'Scheme_Weight': schemes_df[cols[SCHEME_WEIGHT_POS]],
+    })
+    # Like Base Code.py, the benchmark is read from the scheme's first row; as plain objects, since
+    # the default benchmark and the stripped names need not be categories of the parsed column
+    benchmark = holdings['Benchmark'].astype(object).groupby(holdings['Scheme']).transform('first')
+    if default_benchmark:
+        benchmark = benchmark.fillna(default_benchmark)
+    holdings['Benchmark'] = benchmark.where(benchmark.isna(), benchmark.astype(str).str.strip())
+    return holdings
+
+
+def load_benchmark_holdings(path, master=None):
+    master = SecurityMaster() if master is None else master
+    cols = read_header(path, skiprows=3, encoding="ISO-8859-1")
+    benchmarks_df = read_csv_chunked(
+        path, usecols=[cols[BENCHMARK_STOCK_POS], cols[BENCHMARK_NAME_POS], cols[BENCHMARK_WEIGHT_POS]],
+        categorical=[cols[BENCHMARK_STOCK_POS], cols[BENCHMARK_NAME_POS]],
+        numeric=[cols[BENCHMARK_WEIGHT_POS]], skiprows=3, encoding="ISO-8859-1")
+    return pd.DataFrame({
+        'Benchmark': benchmarks_df[cols[BENCHMARK_NAME_POS]].astype(str).str.strip(),
+        'Stock': benchmarks_df[cols[BENCHMARK_STOCK_POS]].astype(str).str.strip().str.upper(),
+        'Security ID': master.ids(benchmarks_df[cols[BENCHMARK_STOCK_POS]]),
+        'Benchmark_Weight': benchmarks_df[cols[BENCHMARK_WEIGHT_POS]],
+    })
+
+
+def active_weights(scheme_holdings, benchmark_holdings):
+    """Outer-join each scheme's holdings with its benchmark (one scheme or many).
+
+    ``scheme_holdings`` has Scheme/Stock/Security ID/Scheme_Weight for schemes sharing one
+    benchmark and ``benchmark_holdings`` has Stock/Security ID/Benchmark_Weight for that
+    benchmark. Rows are joined on the security ID, so spellings of one stock line up.
+    """
+    schemes = pd.DataFrame({'Scheme': scheme_holdings['Scheme'].unique()})
+    benchmark = schemes.merge(benchmark_holdings[['Stock', 'Security ID', 'Benchmark_Weight']], how='cross')
+    merged = pd.merge(scheme_holdings[['Scheme', 'Stock', 'Security ID', 'Scheme_Weight']], benchmark,
+                      on=['Scheme', 'Security ID'], how='outer', suffixes=('', '_Benchmark'))
+    merged['Stock'] = merged['Stock'].fillna(merged.pop('Stock_Benchmark'))
+    merged = merged.drop(columns='Security ID')
+    merged[['Scheme_Weight', 'Benchmark_Weight']] = merged[['Scheme_Weight', 'Benchmark_Weight']].fillna(0)
+    merged['Active_Weight'] = merged['Scheme_Weight'] - merged['Benchmark_Weight']
+    return merged
+
+
+def _benchmark_task(args):
+    benchmark_name, scheme_holdings, benchmark_holdings = args
+    merged = active_weights(scheme_holdings, benchmark_holdings)
+    merged.insert(1, 'Benchmark', benchmark_name)
+    return merged
+
+
+def run_batch(scheme_holdings, benchmark_holdings, workers=None, schemes_per_task=50):
+    """Compute active weights for all schemes, spreading scheme batches across a process pool."""
+    benchmarks = dict(tuple(benchmark_holdings.groupby('Benchmark', sort=False)))
+    tasks, unmatched = [], []
+    for benchmark_name, group in scheme_holdings.groupby('Benchmark', sort=True, dropna=False):
+        if benchmark_name not in benchmarks:
+            unmatched.extend(group['Scheme'].unique())
+            continue
+        schemes = group['Scheme'].unique()
+        for start in range(0, len(schemes), schemes_per_task):
+            batch = group[group['Scheme'].isin(schemes[start:start + schemes_per_task])]
+            tasks.append((benchmark_name, batch, benchmarks[benchmark_name]))
+
+    if unmatched:
+        logger.warning("Skipping %d scheme(s) whose benchmark is not in the benchmarks file: %s",
+                       len(unmatched), ", ".join(map(str, unmatched)))
+    if not tasks:
+        return pd.DataFrame(columns=['Scheme', 'Benchmark', 'Stock', 'Scheme_Weight',
+                                     'Benchmark_Weight', 'Active_Weight'])
+
+    if workers == 1 or len(tasks) == 1:
+        results = [_benchmark_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_benchmark_task, tasks))
+    return pd.concat(results, ignore_index=True)
+
+
+def write_output(result, output):
+    if output.lower().endswith(".xlsx"):
+        # One sheet per benchmark, streamed row by row; write_excel continues a benchmark past
+        # Excel's row limit on <name>_1, <name>_2...
+        write_excel(output, ((str(benchmark_name), group)
+                             for benchmark_name, group in result.groupby('Benchmark', sort=True)))
+    else:
+        # a rerun into the same directory replaces each benchmark's partition instead of adding files to it
+        result.to_parquet(output, partition_cols=['Benchmark'], index=False, existing_data_behavior='delete_matching')
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+MIN_ZOOM, MAX_ZOOM = 2, 16
+CELL_PIXELS = 40
+VIEW_PIXELS = 700
+MAX_MAP_POINTS = 20_000
+_MAX_LAT = 85.05112878
+
+
+def mercator(lat, lon):
+    """Web Mercator x, y in [0, 1) (y grows southwards), as map tiles lay out the world."""
+    lat = np.radians(np.clip(lat, -_MAX_LAT, _MAX_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return x, y
+
+
+def inverse_mercator(x, y):
+    lon = np.asarray(x) * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+    return lat, lon
+
+
+class ClusterPyramid:
+    """Dealer coordinates pre-binned into map-pixel-sized grid cells for every zoom level.
+
+    At zoom ``z`` the world is ``256 * 2**z`` pixels wide, so a cell is ``cell_pixels`` screen
+    pixels across whatever the latitude. Each level keeps one int32 cell code per point;
+    ``clusters`` then only needs a few bincounts over the points a filter selects, and the map
+    gets one row per occupied cell instead of one per dealer.
+    """
+
+    def __init__(self, lat, lon, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cell_pixels=CELL_PIXELS):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        self.n = len(lat)
+        self.rows = np.flatnonzero(valid)
+        self.x, self.y = mercator(lat[self.rows], lon[self.rows])
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+        self.levels = {}
+        for zoom in range(min_zoom, max_zoom + 1):
+            cells = int(2 ** zoom * 256 // cell_pixels) + 1
+            keys = np.floor(self.x * cells).astype(np.int64) * cells + np.floor(self.y * cells).astype(np.int64)
+            codes, uniques = pd.factorize(keys)
+            self.levels[zoom] = codes.astype(np.int32), len(uniques)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _selected(self, mask):
+        if mask is None:
+            return np.arange(len(self.rows))
+        return np.flatnonzero(np.asarray(mask)[self.rows])
+
+    def fit_zoom(self, mask=None, view_pixels=VIEW_PIXELS):
+        """The zoom level at which the selected points fill a view about ``view_pixels`` wide."""
+        selected = self._selected(mask)
+        if not len(selected):
+            return self.min_zoom
+        x, y = self.x[selected], self.y[selected]
+        extent = max(x.max() - x.min(), y.max() - y.min(), 1e-9)
+        zoom = int(np.floor(np.log2(view_pixels / (256 * extent))))
+        return int(np.clip(zoom, self.min_zoom, self.max_zoom))
+
+    def clusters(self, zoom, mask=None, max_points=MAX_MAP_POINTS):
+        """Occupied cells at ``zoom`` for the points ``mask`` selects (a boolean array over all rows).
+
+        Returns (zoom, frame) where frame has the centroid ``lat``/``lon``, the point ``count``
+        and ``row``, the first point's row (for labelling single-dealer cells). When the level
+        has more than ``max_points`` cells the next coarser level is used instead.
+        """
+        selected = self._selected(mask)
+        x, y, rows = self.x[selected], self.y[selected], self.rows[selected]
+        zoom = int(np.clip(zoom, self.min_zoom, self.max_zoom))
+        while True:
+            codes, cells = self.levels[zoom]
+            codes = codes[selected]
+            count = np.bincount(codes, minlength=cells)
+            occupied = np.flatnonzero(count)
+            if len(occupied) <= max_points or zoom == self.min_zoom:
+                break
+            zoom -= 1
+        first = np.full(cells, -1, dtype=np.int64)
+        first[codes[::-1]] = rows[::-1]
+        count = count[occupied]
+        lat, lon = inverse_mercator(np.bincount(codes, weights=x, minlength=cells)[occupied] / count,
+                                    np.bincount(codes, weights=y, minlength=cells)[occupied] / count)
+        return zoom, pd.DataFrame({
+            'lat': lat.astype(np.float32),
+            'lon': lon.astype(np.float32),
+            'count': count.astype(np.int32),
+            'row': first[occupied],
+        })
+
+    def center(self, mask=None):
+        """(lat, lon) of the middle of the selected points' bounding box, or None."""
+        selected = self._selected(mask)
+        if not len(selected):
+            return None
+        x, y = self.x[selected], self.y[selected]
+        lat, lon = inverse_mercator((x.min() + x.max()) / 2, (y.min() + y.max()) / 2)
+        return float(lat), float(lon)
@@ -0,0 +1,140 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from core.frame_cache import cache_key, content_hash, default_cache
+
+FILTER_FACETS = ['Company', 'Sector', 'Position', 'Location', 'Place']
+EXPECTED_COLS = ['Name', 'Company', 'Location', 'Place', 'Latitude', 'Longitude',
+                 'Email Address', 'Linkedin Link', 'Phone Number', 'Position', 'Sector', 'Photo']
+
+
+def normalize_sheet(df):
+    df.columns = df.columns.astype(str).str.strip()
+    for col in EXPECTED_COLS:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+def workbook_sheet_names(data):
+    with pd.ExcelFile(BytesIO(data)) as xls:
+        return xls.sheet_names
+
+
+def read_sheet(path, sheet):
+    return normalize_sheet(pd.read_excel(path, sheet_name=sheet))
+
+
+def load_sheets(data, sheets, digest=None, cache=None, workers=None):
+    """Return {sheet: normalized frame} for ``sheets`` of the workbook bytes ``data``.
+
+    Sheets already in the Parquet cache (keyed by workbook hash and sheet name) skip openpyxl
+    entirely; the rest are parsed concurrently in a process pool and then cached.
+    """
+    cache = cache or default_cache
+    digest = digest or content_hash(data)
+    keys = {sheet: cache_key(digest, "sheet", sheet) for sheet in sheets}
+    frames = {sheet: cache.get(keys[sheet]) for sheet in sheets}
+    missing = [sheet for sheet, df in frames.items() if df is None]
+
+    if missing:
+        # Workers read the workbook from disk rather than each receiving a pickled copy of the bytes
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+            tmp.write(data)
+        try:
+            if len(missing) == 1 or workers == 1:
+                parsed = [read_sheet(tmp.name, sheet) for sheet in missing]
+            else:
+                with ProcessPoolExecutor(max_workers=min(len(missing), workers or os.cpu_count())) as pool:
+                    parsed = list(pool.map(read_sheet, [tmp.name] * len(missing), missing))
+        finally:
+            os.unlink(tmp.name)
+        for sheet, df in zip(missing, parsed):
+            frames[sheet] = cache.put(keys[sheet], df)
+    return {sheet: frames[sheet] for sheet in sheets}
+
+
+def load_dealers(data, selected_sheet, sheets, digest=None, cache=None, workers=None):
+    """The dealer directory for one sheet, or all sheets concatenated when ``selected_sheet`` is "All"."""
+    wanted = sheets if selected_sheet == "All" else [selected_sheet]
+    frames = load_sheets(data, wanted, digest=digest, cache=cache, workers=workers)
+    if len(wanted) == 1:
+        return frames[wanted[0]]
+    return pd.concat([frames[sheet] for sheet in wanted], ignore_index=True)
+
+
+class FilterIndex:
+    """Index over a dealer directory backing the dash.py sidebar filters and name search.
+
+    Each facet column is factorized once into per-value posting lists (row positions), option
+    lists are sorted once, and names are kept in a sorted lower-case array for prefix search.
+    Filtering turns the selected postings into row masks and intersects them, so only the
+    matching rows are ever copied out of the frame.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.options = {}
+        self._value_codes = {}
+        self._postings = {}
+        self._places = {}
+        for col in FILTER_FACETS:
+            codes, uniques = pd.factorize(df[col])
+            order = np.argsort(codes, kind='stable')
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+            values = uniques.tolist()
+            self._value_codes[col] = {value: code for code, value in enumerate(values)}
+            self._postings[col] = (order, offsets)
+            self.options[col] = sorted(values)
+
+        names = df['Name'].dropna().astype(str)
+        self.names = sorted(names.unique().tolist())
+        lowered = names.str.lower().to_numpy(dtype=str)
+        name_order = np.argsort(lowered, kind='stable')
+        self._sorted_names = lowered[name_order]
+        self._name_rows = df.index.get_indexer(names.index)[name_order]
+
+    def rows(self, col, values):
+        """Sorted row positions whose ``col`` is one of ``values``."""
+        order, offsets = self._postings[col]
+        codes = [self._value_codes[col][v] for v in values if v in self._value_codes[col]]
+        if not codes:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in codes]))
+
+    def name_rows(self, prefix, exact=False):
+        """Row positions whose Name starts with (or with ``exact``, equals) ``prefix``, ignoring case."""
+        prefix = prefix.lower()
+        lo = np.searchsorted(self._sorted_names, prefix, side='left')
+        hi = np.searchsorted(self._sorted_names, prefix if exact else prefix + '\U0010ffff', side='right')
+        return np.sort(self._name_rows[lo:hi])
+
+    def mask(self, name=None, **facets):
+        mask = None
+        selections = [(None, name)] if name else []
+        selections += [(col, values) for col, values in facets.items() if values]
+        for col, values in selections:
+            rows = self.name_rows(values) if col is None else self.rows(col, values)
+            hit = np.zeros(len(self.df), dtype=bool)
+            hit[rows] = True
+            mask = hit if mask is None else mask & hit
+        return mask
+
+    def select(self, name=None, **facets):
+        """Filtered directory; the full frame itself (not a copy) when nothing is selected."""
+        mask = self.mask(name, **facets)
+        if mask is None:
+            return self.df
+        return self.df.iloc[np.flatnonzero(mask)].reset_index(drop=True)
+
+    def places(self, location):
+        if location not in self._places:
+            places = self.df['Place'].iloc[self.rows('Location', [location])].dropna().unique()
+            self._places[location] = sorted(places.tolist())
+        return self._places[location]
@@ -0,0 +1,154 @@
+import re
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+EXCEL_MAX_ROWS = 1_048_575
+EXPORT_CHUNK_ROWS = 50_000
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+PDF_FIELDS = ['Name', 'Position', 'Company', 'Location', 'Place', 'Sector',
+              'Email Address', 'Phone Number', 'Linkedin Link']
+
+
+def sheet_title(name, taken, max_length=31):
+    """A valid, unused Excel sheet name derived from ``name``; adds it to ``taken``."""
+    base = _INVALID_SHEET_CHARS.sub("_", str(name)).strip("'") or "Sheet"
+    title, part = base[:max_length], 0
+    while title.lower() in taken:
+        part += 1
+        title = f"{base[:max_length - len(str(part)) - 1]}_{part}"
+    taken.add(title.lower())
+    return title
+
+
+def _frames(data, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Frames of up to about ``chunk_rows`` rows, batching many small frames into one."""
+    if isinstance(data, pd.DataFrame):
+        yield data
+        return
+    batch, rows = [], 0
+    for df in data:
+        batch.append(df)
+        rows += len(df)
+        if rows >= chunk_rows:
+            yield pd.concat(batch, ignore_index=True)
+            batch, rows = [], 0
+    if batch:
+        yield pd.concat(batch, ignore_index=True)
+
+
+def _rows(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Converted a chunk at a time so the object-dtype copy never covers the whole frame
+    float32 = [col for col, dtype in df.dtypes.items() if dtype == np.float32]
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if float32:
+            # via the shortest float32 text, so 8.62 is written as 8.62 rather than 8.619999885559082
+            chunk = chunk.astype({col: str for col in float32}).astype({col: np.float64 for col in float32})
+        chunk = chunk.astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_excel(target, sheets):
+    """Write ``sheets`` to ``target`` (a path or binary file) with openpyxl's write-only workbook.
+
+    ``sheets`` yields (name, data) pairs where data is a DataFrame or an iterable of DataFrames
+    with the same columns, consumed one at a time. Rows are streamed to disk as they are
+    appended instead of being held as cell objects, and a sheet that would pass Excel's row
+    limit continues on ``<name>_1``, ``<name>_2``... openpyxl is imported on first use.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    taken = set()
+    for name, data in sheets:
+        ws, header, written, part = None, None, 0, 0
+        for df in _frames(data):
+            if header is None:
+                header = [str(col) for col in df.columns]
+            for row in _rows(df):
+                if ws is None or written == EXCEL_MAX_ROWS:
+                    ws = wb.create_sheet(sheet_title(f"{str(name)[:28]}_{part}" if part else name, taken))
+                    ws.append(header)
+                    written, part = 0, part + 1
+                ws.append(row)
+                written += 1
+        if ws is None:
+            ws = wb.create_sheet(sheet_title(name, taken))
+            if header is not None:
+                ws.append(header)
+    if not taken:
+        wb.create_sheet("Sheet")
+    wb.save(target)
+
+
+def excel_bytes(sheets):
+    buffer = BytesIO()
+    write_excel(buffer, sheets)
+    return buffer.getvalue()
+
+
+def csv_bytes(df, **to_csv_kwargs):
+    """UTF-8 CSV bytes, encoded by pandas chunk by chunk rather than via one large str."""
+    buffer = BytesIO()
+    df.to_csv(buffer, index=False, encoding="utf-8", **to_csv_kwargs)
+    return buffer.getvalue()
+
+
+def display_column(series):
+    """Column as display text: missing and blank values show as "-"."""
+    text = series.where(series.notna(), "").astype(str)
+    return text.where(text.str.strip() != "", "-")
+
+
+def contacts_pdf(df, title="Dealer Directory Search Results"):
+    """PDF listing of dealer contacts, one block of fields per row; reportlab is imported on first use."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width / 2, height - 40, title)
+    y = height - 70
+    c.setFont("Helvetica", 10)
+    line_height = 14
+    # One text object per page instead of one per drawString call
+    text = c.beginText()
+    text.setFont("Helvetica", 10)
+
+    def draw(x, y, value):
+        text.setTextOrigin(x, y)
+        text.textOut(value)
+
+    columns = [display_column(df[col]).tolist() for col in PDF_FIELDS]
+    for name, position, company, location, place, sector, email, phone, linkedin in zip(*columns):
+        if y < 80:
+            c.drawText(text)
+            c.showPage()
+            y = height - 40
+            c.setFont("Helvetica", 10)
+            text = c.beginText()
+            text.setFont("Helvetica", 10)
+        draw(40, y, f"Name: {name}")
+        draw(300, y, f"Position: {position}")
+        y -= line_height
+        draw(40, y, f"Company: {company}")
+        draw(300, y, f"Location: {location}")
+        y -= line_height
+        draw(40, y, f"Place: {place}")
+        draw(300, y, f"Sector: {sector}")
+        y -= line_height
+        draw(40, y, f"Email: {email}")
+        draw(300, y, f"Phone: {phone}")
+        y -= line_height
+        draw(40, y, f"LinkedIn: {linkedin}")
+        y -= line_height + 10
+        c.line(40, y, width - 40, y)
+        y -= 20
+    c.drawText(text)
+    c.save()
+    buffer.seek(0)
+    return buffer.getvalue()
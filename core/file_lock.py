@@ -0,0 +1,48 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# One lock per path within this process, so threads serialize here before contending for the file
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``path`` (created if missing) across threads and processes.
+
+    Used around read-modify-write updates of files that several app servers or batch runs
+    may share, such as the holdings store's manifest and the security master's tables.
+    """
+    path = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+                return
+            while True:
+                # LK_LOCK retries for about ten seconds before giving up; keep waiting
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            # closing the descriptor also drops the flock
+            os.close(fd)
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+# Parsed frames are stored as Parquet files named after the hash of the source bytes,
+# so every session that uploads the same file gets the same cache entry.
+CACHE_DIR = Path(os.environ.get("FRAME_CACHE_DIR", Path(tempfile.gettempdir()) / "frame_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("FRAME_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Part of every key: bump it whenever a change to read_schemes, prepare_schemes, read_csv_chunked,
+# the dealer loaders... changes the frames they produce, so older cache entries are not reused
+CACHE_VERSION = 1
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def upload_digest(uploaded_file):
+    """Content hash of a Streamlit upload, computed once per file_id and session.
+
+    Reruns and other sessions then reuse anything cached under the same content hash.
+    """
+    import streamlit as st
+    digests = st.session_state.setdefault("upload_digests", {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = content_hash(uploaded_file.getvalue())
+    return digests[uploaded_file.file_id]
+
+
+def parquet_safe(df):
+    # read_csv can leave object columns holding a mix of str and numbers, which Arrow rejects
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def prune(directory, pattern, max_bytes):
+    """Delete the least recently used files matching ``pattern`` until they fit in ``max_bytes``."""
+    entries = []
+    for path in Path(directory).glob(pattern):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+
+
+class FrameCache:
+    """Size-bounded LRU cache of DataFrames on local disk, one Parquet file per key."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / f"{key}.parquet"
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return df
+
+    def put(self, key, df):
+        """Store ``df`` and return the frame as it will be read back (mixed object columns become str)."""
+        tmp = self.directory / f".{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            try:
+                df.to_parquet(tmp)
+            except (ValueError, TypeError):
+                df = parquet_safe(df)
+                df.to_parquet(tmp)
+            os.replace(tmp, self.path(key))
+        except (OSError, ValueError, TypeError):
+            # unwritable cache dir or a frame Parquet cannot represent (e.g. duplicate column names)
+            tmp.unlink(missing_ok=True)
+            return df
+        self.evict()
+        return df
+
+    def get_or_build(self, key, build):
+        df = self.get(key)
+        if df is None:
+            df = self.put(key, build())
+        return df
+
+    def evict(self):
+        prune(self.directory, "*.parquet", self.max_bytes)
+
+
+default_cache = FrameCache()
+
+
+def cache_key(digest, *parts):
+    """Key for a frame derived from the content ``digest`` by the options in ``parts``, under CACHE_VERSION."""
+    return f"{digest}-{content_hash(repr((CACHE_VERSION,) + parts).encode())[:12]}"
+
+
+def read_csv_cached(data, digest=None, prepare=None, tag="raw", cache=None, **read_csv_kwargs):
+    """Parse CSV bytes (optionally post-processed by ``prepare``) through the disk cache.
+
+    The key covers the content hash, ``tag`` and the read_csv options, so the same upload
+    read with different ``skiprows`` or preparation steps gets separate entries.
+    """
+    cache = cache or default_cache
+    key = cache_key(digest or content_hash(data), tag, sorted(read_csv_kwargs.items()))
+
+    def build():
+        df = pd.read_csv(BytesIO(data), **read_csv_kwargs)
+        return prepare(df) if prepare else df
+
+    return cache.get_or_build(key, build)
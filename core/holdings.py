@@ -0,0 +1,178 @@
+import re
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Canonical column name -> regex patterns used to detect it in the uploaded schemes.csv
+SCHEME_COLUMN_PATTERNS = {
+    'Scheme Name': ["scheme"],
+    'Stock Name': ["security", "stock"],
+    'Industry': ["industry"],
+    'Fund Weight': ["% of holdings", "fund weight", "scheme weight"],
+    'Benchmark Weight': ["benchmark weight", "index weight", "nifty weight"],
+    'Active Weight': ["active weight"],
+}
+WEIGHT_COLUMNS = ['Fund Weight', 'Benchmark Weight', 'Active Weight']
+NAME_COLUMNS = ['Scheme Name', 'Stock Name', 'Industry']
+
+INGEST_CHUNKSIZE = 200_000
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, missing, columns):
+        super().__init__(f"Missing columns in your CSV: {', '.join(missing)}")
+        self.missing = missing
+        self.columns = columns
+
+
+# Function to match columns using regex
+def find_column(possible_patterns, columns):
+    for col in columns:
+        for pattern in possible_patterns:
+            if re.search(pattern, col, re.IGNORECASE):
+                return col
+    return None
+
+
+def resolve_scheme_columns(columns):
+    """Return ({actual column: canonical name}, [missing canonical names])."""
+    mapping, missing = {}, []
+    for name, patterns in SCHEME_COLUMN_PATTERNS.items():
+        col = find_column(patterns, columns)
+        if col:
+            mapping[col] = name
+        else:
+            missing.append(name)
+    return mapping, missing
+
+
+def prepare_schemes(schemes_df):
+    """Rename detected columns, coerce weights to numeric and drop rows missing essentials."""
+    actual_cols = schemes_df.columns.tolist()
+    mapping, missing = resolve_scheme_columns(actual_cols)
+    if missing:
+        raise MissingColumnsError(missing, actual_cols)
+
+    schemes_df = schemes_df.rename(columns=mapping)
+    for col in WEIGHT_COLUMNS:
+        schemes_df[col] = pd.to_numeric(schemes_df[col], errors='coerce')
+    return schemes_df.dropna(subset=NAME_COLUMNS)
+
+
+def _open(source):
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def read_header(source, **read_csv_kwargs):
+    return pd.read_csv(_open(source), nrows=0, **read_csv_kwargs).columns.tolist()
+
+
+def read_csv_chunked(source, usecols, categorical=(), numeric=(), chunksize=INGEST_CHUNKSIZE,
+                     **read_csv_kwargs):
+    """Stream a CSV in chunks, keeping only ``usecols``.
+
+    ``categorical`` columns are stored as categories and ``numeric`` columns are coerced to
+    float32, chunk by chunk, so the full object-dtype frame never exists in memory.
+    """
+    usecols = list(dict.fromkeys(usecols))
+    categorical = [col for col in dict.fromkeys(categorical) if col not in numeric]
+    chunks = []
+    reader = pd.read_csv(_open(source), usecols=usecols, chunksize=chunksize,
+                         dtype={col: 'category' for col in categorical}, **read_csv_kwargs)
+    for chunk in reader:
+        for col in numeric:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float32')
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=usecols)
+
+    columns = chunks[0].columns
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for col in categorical:
+        # an all-missing chunk infers empty categories of a different dtype, so align them first
+        parts = [chunk[col].cat.set_categories(chunk[col].cat.categories.astype(str)) for chunk in chunks]
+        df[col] = union_categoricals(parts, sort_categories=True)
+    return df[columns]
+
+
+def read_schemes(source, chunksize=INGEST_CHUNKSIZE, **read_csv_kwargs):
+    """Chunked equivalent of read_csv + ``prepare_schemes`` that only keeps the resolved columns."""
+    actual_cols = read_header(source, **read_csv_kwargs)
+    mapping, missing = resolve_scheme_columns(actual_cols)
+    if missing:
+        raise MissingColumnsError(missing, actual_cols)
+
+    names = {name: col for col, name in mapping.items()}
+    schemes_df = read_csv_chunked(source, usecols=list(mapping),
+                                  categorical=[names[name] for name in NAME_COLUMNS],
+                                  numeric=[names[name] for name in WEIGHT_COLUMNS],
+                                  chunksize=chunksize, **read_csv_kwargs)
+    return schemes_df.rename(columns=mapping).dropna(subset=NAME_COLUMNS)
+
+
+SchemeSummary = namedtuple('SchemeSummary', ['industry_summary', 'top_over', 'top_under'])
+
+
+def _split_by_scheme(df):
+    return {scheme: group for scheme, group in df.groupby('Scheme Name', sort=False, observed=True)}
+
+
+def build_scheme_index(schemes_df, top_n=10):
+    """Compute the industry summary and top-N over/underweight stocks for every scheme in one pass.
+
+    Expects a frame produced by ``prepare_schemes`` and returns {scheme name: SchemeSummary}.
+    """
+    industry_summary = (schemes_df.groupby(['Scheme Name', 'Industry'], observed=True)
+                        [['Fund Weight', 'Benchmark Weight']].sum()
+                        .reset_index(level='Industry'))
+    industry_summary['Active Weight'] = industry_summary['Fund Weight'] - industry_summary['Benchmark Weight']
+
+    weighted = schemes_df.dropna(subset=['Active Weight'])
+    top_over = (weighted.sort_values(['Scheme Name', 'Active Weight'], ascending=[True, False], kind='stable')
+                .groupby('Scheme Name', observed=True).head(top_n))
+    top_under = (weighted.sort_values(['Scheme Name', 'Active Weight'], ascending=[True, True], kind='stable')
+                 .groupby('Scheme Name', observed=True).head(top_n))
+
+    industries = _split_by_scheme(industry_summary)
+    overs = _split_by_scheme(top_over)
+    unders = _split_by_scheme(top_under)
+    empty = schemes_df.iloc[:0]
+    index = {}
+    for scheme in schemes_df['Scheme Name'].unique():
+        index[scheme] = SchemeSummary(
+            industries[scheme].reset_index(drop=True),
+            overs.get(scheme, empty),
+            unders.get(scheme, empty),
+        )
+    return index
+
+
+# Sheet name -> SchemeSummary field, in the order main.py's Excel report lists them
+REPORT_SHEETS = {
+    'Industry Summary': 'industry_summary',
+    'Top Overweight': 'top_over',
+    'Top Underweight': 'top_under',
+}
+
+
+def scheme_report_sheets(summary):
+    """(sheet name, frame) pairs for one scheme's Excel report."""
+    return [(sheet, getattr(summary, field)) for sheet, field in REPORT_SHEETS.items()]
+
+
+def all_schemes_report_sheets(scheme_index, schemes_per_frame=500):
+    """Long-format report sheets covering every scheme, yielded lazily ``schemes_per_frame`` schemes at a time."""
+    schemes = list(scheme_index)
+
+    def frames(field):
+        for start in range(0, len(schemes), schemes_per_frame):
+            names = schemes[start:start + schemes_per_frame]
+            parts = [getattr(scheme_index[scheme], field) for scheme in names]
+            df = pd.concat(parts, ignore_index=True)
+            if 'Scheme Name' not in df.columns:
+                df.insert(0, 'Scheme Name', np.repeat(names, [len(part) for part in parts]))
+            yield df
+    return [(sheet, frames(field)) for sheet, field in REPORT_SHEETS.items()]
@@ -0,0 +1,213 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.file_lock import file_lock
+from core.frame_cache import parquet_safe
+
+# Appendable monthly history of schemes.csv / benchmarks.csv snapshots, one Parquet file per
+# period and table, so adding a month never rewrites earlier months.
+STORE_DIR = Path(os.environ.get("HOLDINGS_STORE_DIR", Path.home() / ".holdings_store"))
+
+KEY_COLUMNS = ['Scheme Name', 'Stock Name']
+CHANGE_COLUMNS = ['Scheme Name', 'Stock Name', 'Status', 'Previous Weight', 'Fund Weight', 'Weight Change',
+                  'Previous Active Weight', 'Active Weight', 'Active Weight Change']
+SUMMARY_COLUMNS = ['Period', 'Previous Period', 'Scheme Name', 'Holdings', 'Entries', 'Exits',
+                   'Turnover (%)', 'Active Drift (%)']
+
+
+def period_key(period):
+    """Normalize '2025-01', 'Jan 2025', a date... to the month key the store uses ('2025-01')."""
+    return str(pd.Period(period, freq='M'))
+
+
+class HoldingsStore:
+    """Monthly holdings keyed by period, scheme and stock, with month-over-month changes.
+
+    ``append`` writes one period's holdings (the frame ``read_schemes`` produces) and derives
+    that period's changes against the previous stored period: stock entries and exits, weight
+    and active-weight changes, and per-scheme turnover and active drift (half the summed
+    absolute change). Only the new period, and the period after it when a month is filled in
+    out of order, is recomputed; history is read back from the small per-period summaries.
+    """
+
+    TABLES = ('holdings', 'benchmarks', 'changes', 'summary')
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = Path(directory)
+
+    def _lock(self):
+        # append and remove read, change and rewrite the manifest; serialize them across
+        # sessions and any batch job sharing the directory
+        return file_lock(self.directory / ".lock")
+
+    def path(self, table, period):
+        return self.directory / table / f"{period}.parquet"
+
+    def _write(self, table, period, df):
+        path = self.path(table, period)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{period}.{uuid.uuid4().hex}.tmp")
+        try:
+            try:
+                df.to_parquet(tmp, index=False)
+            except (ValueError, TypeError):
+                parquet_safe(df).to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _read(self, table, period, columns=None):
+        try:
+            return pd.read_parquet(self.path(table, period), columns=columns)
+        except (OSError, ValueError):
+            return None
+
+    def manifest(self):
+        try:
+            with open(self.directory / "manifest.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        path = self.directory / "manifest.json"
+        tmp = path.with_name(f".manifest.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def periods(self):
+        return sorted(self.manifest())
+
+    def holdings(self, period, columns=None):
+        return self._read('holdings', period_key(period), columns)
+
+    def benchmarks(self, period):
+        return self._read('benchmarks', period_key(period))
+
+    def changes(self, period, scheme=None):
+        """Stock-level changes of ``period`` against the stored period before it, optionally for one scheme."""
+        if scheme is None:
+            return self._read('changes', period_key(period))
+        try:
+            return pd.read_parquet(self.path('changes', period_key(period)), filters=[('Scheme Name', '==', scheme)])
+        except (OSError, ValueError):
+            return None
+
+    def append(self, period, schemes_df, benchmarks_df=None, source=None):
+        """Store one period's snapshot and update the month-over-month changes around it.
+
+        ``source`` (e.g. the upload's content hash) is recorded so re-adding the same file for
+        the same period is a no-op; a different file for a stored period replaces it.
+        Returns the per-scheme summary for ``period``.
+        """
+        period = period_key(period)
+        with self._lock():
+            manifest = self.manifest()
+            if source is not None and manifest.get(period, {}).get('source') == source:
+                return self._read('summary', period)
+
+            holdings = schemes_df.dropna(subset=KEY_COLUMNS)
+            self._write('holdings', period, holdings)
+            if benchmarks_df is not None:
+                self._write('benchmarks', period, benchmarks_df)
+            manifest[period] = {'source': source, 'rows': int(len(holdings)), 'schemes': int(holdings['Scheme Name'].nunique())}
+            self._write_manifest(manifest)
+
+            periods = sorted(manifest)
+            position = periods.index(period)
+            previous = periods[position - 1] if position else None
+            summary = self._update_changes(period, previous, current=holdings)
+            if position + 1 < len(periods):
+                # a month filled in out of order: the following month now compares against it
+                self._update_changes(periods[position + 1], period, previous_holdings=holdings)
+            return summary
+
+    def _update_changes(self, period, previous, current=None, previous_holdings=None):
+        columns = KEY_COLUMNS + ['Fund Weight', 'Active Weight']
+        current = (current if current is not None else self.holdings(period))[columns]
+        if previous is None:
+            prev = pd.DataFrame(columns=columns)
+        else:
+            prev = (previous_holdings if previous_holdings is not None else self.holdings(previous))[columns]
+        changes = holdings_changes(prev, current)
+        summary = changes_summary(changes, current)
+        summary.insert(0, 'Period', period)
+        summary.insert(1, 'Previous Period', previous)
+        if previous is None:
+            # nothing to compare the first stored month against
+            summary[['Entries', 'Exits', 'Turnover (%)', 'Active Drift (%)']] = None
+        self._write('changes', period, changes)
+        self._write('summary', period, summary)
+        return summary
+
+    def summary(self, schemes=None):
+        """Per-scheme, per-period turnover, entries/exits and active drift across all stored periods."""
+        frames = []
+        for period in self.periods():
+            df = self._read('summary', period)
+            if df is None:
+                continue
+            if schemes is not None:
+                df = df[df['Scheme Name'].isin(schemes)]
+            frames.append(df.astype({'Scheme Name': str}))
+        if not frames:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def remove(self, period):
+        period = period_key(period)
+        with self._lock():
+            manifest = self.manifest()
+            if period not in manifest:
+                return
+            periods = sorted(manifest)
+            position = periods.index(period)
+            del manifest[period]
+            self._write_manifest(manifest)
+            for table in self.TABLES:
+                self.path(table, period).unlink(missing_ok=True)
+            if position + 1 < len(periods):
+                self._update_changes(periods[position + 1], periods[position - 1] if position else None)
+
+
+def _weights(df):
+    grouped = df.astype({col: str for col in KEY_COLUMNS}).groupby(KEY_COLUMNS, sort=False)
+    return grouped[['Fund Weight', 'Active Weight']].sum(min_count=1)
+
+
+def holdings_changes(previous, current):
+    """Outer join of two periods' holdings on scheme and stock, with entry/exit status and weight changes."""
+    merged = _weights(previous).join(_weights(current), how='outer', lsuffix=' Previous', rsuffix='')
+    merged = merged.reset_index().rename(columns={'Fund Weight Previous': 'Previous Weight',
+                                                  'Active Weight Previous': 'Previous Active Weight'})
+    held_before = merged['Previous Weight'].notna()
+    held_now = merged['Fund Weight'].notna()
+    merged['Status'] = pd.Categorical.from_codes(np.where(held_before, np.where(held_now, 0, 2), 1),
+                                                 ['Held', 'Entry', 'Exit'])
+    merged['Weight Change'] = merged['Fund Weight'].fillna(0) - merged['Previous Weight'].fillna(0)
+    merged['Active Weight Change'] = merged['Active Weight'].fillna(0) - merged['Previous Active Weight'].fillna(0)
+    return merged[CHANGE_COLUMNS]
+
+
+def changes_summary(changes, current):
+    """Per-scheme counts and half-sum turnover/drift from ``holdings_changes``, for schemes held in ``current``."""
+    grouped = pd.DataFrame({
+        'Holdings': changes['Fund Weight'].notna(),
+        'Held Before': changes['Previous Weight'].notna(),
+        'Entries': changes['Status'] == 'Entry',
+        'Exits': changes['Status'] == 'Exit',
+        'Turnover (%)': changes['Weight Change'].abs() / 2,
+        'Active Drift (%)': changes['Active Weight Change'].abs() / 2,
+    }).groupby(changes['Scheme Name'], sort=True).sum()
+    summary = grouped.drop(columns='Held Before')
+    # a scheme missing from either month has no month-over-month turnover
+    held_before = grouped['Held Before'] > 0
+    summary.loc[~held_before, ['Turnover (%)', 'Active Drift (%)']] = None
+    summary = summary[summary.index.isin(current['Scheme Name'].astype(str).unique())]
+    return summary.reset_index()
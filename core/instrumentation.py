@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# One JSON object per line on stderr, e.g. for a log collector; STAGE_LOG_LEVEL=WARNING silences it
+logger = logging.getLogger("stages")
+DEBUG_ENV = "STAGE_DEBUG"
+
+# tracemalloc is process-wide: it runs while any session has asked for traced memory on a run
+# within the last TRACE_SESSION_TTL seconds, so a closed tab does not leave it on for good
+TRACE_SESSION_TTL = float(os.environ.get("STAGE_TRACE_TTL", 600))
+_tracing_sessions = {}
+_tracing_lock = threading.Lock()
+
+
+def _request_tracing(session, wanted):
+    now = time.monotonic()
+    with _tracing_lock:
+        if wanted:
+            _tracing_sessions[session] = now
+        else:
+            _tracing_sessions.pop(session, None)
+        for stale in [s for s, seen in _tracing_sessions.items() if now - seen > TRACE_SESSION_TTL]:
+            del _tracing_sessions[stale]
+        if _tracing_sessions and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not _tracing_sessions and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def configure_logging(level=None):
+    """Attach a stderr handler that writes the bare JSON records (once per process)."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level or os.environ.get("STAGE_LOG_LEVEL", "INFO"))
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+class Stage:
+    """A timed stage; set ``rows`` (or any extra field) on it from inside the ``with`` block."""
+
+    def __init__(self, name, rows=None, **fields):
+        self.name = name
+        self.rows = rows
+        self.fields = fields
+        self.seconds = None
+        self.peak_mb = None
+        self._peak = 0
+        self._start = 0
+        self._rss_start = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+
+class StageLog:
+    """Wall time, rows and peak memory for the stages of one app run.
+
+    With ``trace_memory`` the peak is how far Python allocations rose above their level at the
+    start of each stage, from tracemalloc (which slows allocation-heavy code down noticeably);
+    otherwise it is how far the stage raised the process's peak resident set size, where the
+    platform reports one (None when the stage stayed under the earlier high-water mark).
+    Tracing stays on while any ``session`` has asked for it within ``TRACE_SESSION_TTL``
+    seconds. Its counters are process-wide, so traced peaks include other sessions'
+    allocations and are only exact while a single session is running stages.
+    """
+
+    def __init__(self, app, trace_memory=False, session=None):
+        self.app = app
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self._stack = []
+        _request_tracing(session or self.run_id, trace_memory)
+
+    @contextmanager
+    def stage(self, name, rows=None, **fields):
+        current = Stage(name, rows, **fields)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # keep the enclosing stage's peak so far before the counter is reset for this one
+            if self._stack:
+                parent = self._stack[-1]
+                parent._peak = max(parent._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            current._start = tracemalloc.get_traced_memory()[0]
+        else:
+            current._rss_start = _peak_rss_mb()
+        self._stack.append(current)
+        started = time.perf_counter()
+        error = None
+        try:
+            yield current
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            current.seconds = time.perf_counter() - started
+            self._stack.pop()
+            tracing = tracing and tracemalloc.is_tracing()
+            if tracing:
+                peak = max(current._peak, tracemalloc.get_traced_memory()[1])
+                current.peak_mb = round((peak - current._start) / 1024 ** 2, 1)
+            else:
+                # the high-water mark only says something about this stage if it moved during it
+                rss_start, rss_end = current._rss_start, _peak_rss_mb()
+                grew = rss_start is not None and rss_end is not None and rss_end > rss_start
+                current.peak_mb = round(rss_end - rss_start, 1) if grew else None
+            self._record(current, error, "traced" if tracing else "rss")
+
+    def _record(self, stage, error, memory):
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "app": self.app,
+            "run": self.run_id,
+            "stage": stage.name,
+            "seconds": round(stage.seconds, 4),
+            "rows": None if stage.rows is None else int(stage.rows),
+            "peak_mb": stage.peak_mb,
+            "memory": memory,
+            "depth": len(self._stack),
+            **stage.fields,
+        }
+        if error:
+            record["error"] = error
+        self.records.append(record)
+        logger.info(json.dumps(record, default=str))
+
+    def frame(self):
+        import pandas as pd
+        columns = ["stage", "seconds", "rows", "peak_mb", "memory"]
+        df = pd.DataFrame(self.records)
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        df["stage"] = ["  " * depth + name for depth, name in zip(df["depth"], df["stage"])]
+        extra = [col for col in df.columns if col not in columns + ["ts", "app", "run", "depth"]]
+        return df[columns + extra]
+
+
+def debug_enabled():
+    import streamlit as st
+    return os.environ.get(DEBUG_ENV) == "1" or st.query_params.get("debug") == "1"
+
+
+def debug_panel(stage_log):
+    """Sidebar expander with this run's stage timings; shown with ?debug=1 or STAGE_DEBUG=1."""
+    import streamlit as st
+    if not debug_enabled():
+        return
+    with st.sidebar.expander("⏱️ Stage timings", expanded=True):
+        st.dataframe(stage_log.frame(), hide_index=True)
+        st.caption(f"Run {stage_log.run_id}: {sum(r['seconds'] for r in stage_log.records if not r['depth']):.3f} s "
+                   "in instrumented stages")
+        st.checkbox("Trace Python memory per stage (slower)", key="trace_memory")
+
+
+def app_stage_log(app):
+    """The StageLog for the current Streamlit run of ``app``, honouring the panel's memory tracing toggle.
+
+    Per-stage wall time, rows and memory for the run go to stderr as JSON lines and, with
+    ?debug=1, to the sidebar panel.
+    """
+    import streamlit as st
+    configure_logging()
+    session = st.session_state.setdefault("stage_log_session", uuid.uuid4().hex)
+    return StageLog(app, trace_memory=st.session_state.get("trace_memory", False), session=session)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+
+def stock_key(series):
+    """Stock names as matched across files elsewhere in the apps: stripped and upper-cased."""
+    return series.astype(str).str.strip().str.upper()
+
+
+def known_stocks(stocks):
+    """Mask of usable stock keys: not missing, and not the -1 ``SecurityMaster.ids`` gives blank names."""
+    stocks = pd.Series(np.asarray(stocks))
+    known = stocks.notna().to_numpy()
+    if pd.api.types.is_integer_dtype(stocks.dtype):
+        known = known & (stocks.to_numpy() >= 0)
+    return known
+
+
+class HoldingsMatrix:
+    """Sparse scheme x stock weight matrix, stored column-wise (CSC) in plain NumPy arrays.
+
+    ``indptr[k]:indptr[k + 1]`` slices ``rows`` (scheme positions) and ``weights`` for stock
+    ``stocks[k]``. Duplicate scheme/stock rows are summed, and rows with non-positive weights or
+    no known stock dropped.
+    With ``normalize`` every scheme's weights are rescaled to sum to 100, so cash and other
+    non-equity lines do not count towards active share or overlap.
+    """
+
+    def __init__(self, schemes, stocks, weights, normalize=False):
+        frame = pd.DataFrame({'scheme': np.asarray(schemes), 'stock': np.asarray(stocks),
+                              'weight': pd.to_numeric(np.asarray(weights), errors='coerce')})
+        frame = frame[(frame['weight'] > 0) & known_stocks(frame['stock'])].dropna(subset=['scheme'])
+        frame = frame.groupby(['stock', 'scheme'], observed=True, sort=True)['weight'].sum().reset_index()
+
+        scheme_codes, self.schemes = pd.factorize(frame['scheme'], sort=True)
+        stock_codes, self.stocks = pd.factorize(frame['stock'], sort=True)
+        self.rows = scheme_codes.astype(np.intp)
+        self.weights = frame['weight'].to_numpy(dtype=np.float64)
+        if normalize:
+            totals = np.bincount(self.rows, weights=self.weights, minlength=len(self.schemes))
+            self.weights = 100 * self.weights / totals[self.rows]
+        # rows are sorted by stock, so each stock's holders are one contiguous run
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(stock_codes, minlength=len(self.stocks)))])
+        self._stock_codes = stock_codes
+        self._stock_positions = pd.Index(self.stocks)
+
+    @property
+    def shape(self):
+        return len(self.schemes), len(self.stocks)
+
+    def totals(self):
+        return np.bincount(self.rows, weights=self.weights, minlength=len(self.schemes))
+
+    def active_share(self, stocks, weights, normalize=False):
+        """Active share (%) of every scheme against one benchmark: half the sum of |scheme - benchmark| weights.
+
+        Only the stocks each scheme holds are visited; benchmark stocks a scheme does not hold
+        contribute their full weight through the benchmark's total.
+        """
+        bench = pd.Series(pd.to_numeric(np.asarray(weights), errors='coerce'), index=np.asarray(stocks))
+        bench = bench[(bench > 0).to_numpy() & known_stocks(stocks)].groupby(level=0).sum()
+        if normalize and bench.sum() > 0:
+            bench = 100 * bench / bench.sum()
+        dense = np.zeros(len(self.stocks))
+        positions = self._stock_positions.get_indexer(bench.index)
+        dense[positions[positions >= 0]] = bench.to_numpy()[positions >= 0]
+
+        b = dense[self._stock_codes]
+        held = np.bincount(self.rows, weights=np.abs(self.weights - b) - b, minlength=len(self.schemes))
+        return (bench.sum() + held) / 2
+
+    def active_share_table(self, benchmarks, stocks, weights, normalize=False):
+        """Schemes x benchmarks frame of active share (%) against every benchmark.
+
+        ``benchmarks``, ``stocks`` and ``weights`` are parallel arrays of benchmark name, stock key
+        (matching the keys the matrix was built with) and weight.
+        """
+        frame = pd.DataFrame({'benchmark': np.asarray(benchmarks), 'stock': np.asarray(stocks),
+                              'weight': np.asarray(weights)})
+        table = {}
+        for name, group in frame.groupby('benchmark', observed=True, sort=True):
+            table[name] = self.active_share(group['stock'], group['weight'], normalize=normalize)
+        return pd.DataFrame(table, index=pd.Index(self.schemes, name='Scheme'))
+
+    def overlap(self):
+        """Schemes x schemes portfolio overlap (%): the sum over common stocks of the smaller weight.
+
+        Built one stock column at a time from the sparse holders of that stock, so the work is
+        proportional to the number of scheme pairs that actually share a holding.
+        """
+        n = len(self.schemes)
+        result = np.zeros((n, n), dtype=np.float32)
+        dense, block = np.zeros(n, dtype=np.float32), None
+        for k in range(len(self.stocks)):
+            lo, hi = self.indptr[k], self.indptr[k + 1]
+            if hi - lo < 2:
+                continue
+            rows = self.rows[lo:hi]
+            w = self.weights[lo:hi].astype(np.float32)
+            if hi - lo > n // 3:
+                # widely held stock: a contiguous full-size update beats scattering into a large sub-block
+                block = np.empty((n, n), dtype=np.float32) if block is None else block
+                dense[:] = 0
+                dense[rows] = w
+                np.minimum(dense[:, None], dense[None, :], out=block)
+                result += block
+            else:
+                result[np.ix_(rows, rows)] += np.minimum.outer(w, w)
+        # a scheme's overlap with itself is all of its holdings, including single-holder stocks
+        result[np.diag_indices(n)] = self.totals()
+        return result
+
+
+def overlap_pairs(matrix, overlap, min_overlap=0.0):
+    """Long frame of scheme pairs (each pair once) with overlap of at least ``min_overlap`` %, highest first."""
+    i, j = np.triu_indices(len(matrix.schemes), k=1)
+    values = overlap[i, j]
+    keep = values >= min_overlap
+    i, j, values = i[keep], j[keep], values[keep]
+    order = np.argsort(-values, kind='stable')
+    return pd.DataFrame({
+        'Scheme A': np.asarray(matrix.schemes)[i[order]],
+        'Scheme B': np.asarray(matrix.schemes)[j[order]],
+        'Overlap (%)': values[order].round(2),
+    })
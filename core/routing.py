@@ -0,0 +1,459 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+MATRIX_BLOCK_SIZE = 2048
+DEFAULT_TIME_BUDGET = 2.0
+AVG_SPEED_KMH = 40
+GRID_CELL_DEG = 0.1
+KM_PER_DEG_LAT = np.pi * EARTH_RADIUS_KM / 180
+_EPS = 1e-9
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works element-wise on scalars or broadcastable arrays."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(lat, lon, lat2=None, lon2=None, dtype=np.float64, block_size=MATRIX_BLOCK_SIZE):
+    """Pairwise haversine distances (km) from every (lat, lon) to every (lat2, lon2).
+
+    Rows are computed ``block_size`` at a time so temporaries stay bounded for large n;
+    ``dtype=np.float32`` halves the memory of the result.
+    """
+    lat = np.asarray(lat, dtype=dtype)
+    lon = np.asarray(lon, dtype=dtype)
+    lat2 = lat if lat2 is None else np.asarray(lat2, dtype=dtype)
+    lon2 = lon if lon2 is None else np.asarray(lon2, dtype=dtype)
+
+    out = np.empty((len(lat), len(lat2)), dtype=dtype)
+    for start in range(0, len(lat), block_size):
+        stop = start + block_size
+        out[start:stop] = haversine(lat[start:stop, None], lon[start:stop, None], lat2[None, :], lon2[None, :])
+    return out
+
+
+def route_distance(dist_matrix, path):
+    path = np.asarray(path)
+    return float(dist_matrix[path[:-1], path[1:]].sum())
+
+
+def christofides_path(dist_matrix):
+    """Open path from networkx's Christofides approximation over the complete graph of ``dist_matrix``."""
+    n = len(dist_matrix)
+    if n < 3:
+        # nothing to optimise, and networkx rejects the one-node graph left when stops coincide
+        return list(range(n))
+    import networkx as nx
+
+    rows, cols = np.triu_indices(n, 1)
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), dist_matrix[rows, cols].tolist()))
+    return nx.approximation.traveling_salesman_problem(G, cycle=False)
+
+
+class GeoIndex:
+    """Uniform lat/lon grid over points for radius and k-nearest queries.
+
+    Points are sorted by grid cell so each row of cells a query touches is one contiguous
+    slice found by binary search; only the points in those cells get an exact haversine check.
+    """
+
+    def __init__(self, lat, lon, cell_deg=GRID_CELL_DEG):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.cell_deg = cell_deg
+        self.n = len(lat)
+        self._lon_cells = int(np.ceil(360 / cell_deg)) + 1
+        keys = self._cell_key(self._cell(lat[valid], -90), self._cell(lon[valid], -180))
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._rows = valid[order]
+        self._lat = lat[self._rows]
+        self._lon = lon[self._rows]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _cell(self, value, origin):
+        return np.floor((np.asarray(value) - origin) / self.cell_deg).astype(np.int64)
+
+    def _cell_key(self, lat_cell, lon_cell):
+        return lat_cell * self._lon_cells + lon_cell
+
+    def _candidates(self, lat, lon, radius_km):
+        dlat = radius_km / KM_PER_DEG_LAT
+        lat_lo, lat_hi = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        cos_lat = np.cos(np.radians(max(abs(lat_lo), abs(lat_hi))))
+        dlon = radius_km / (KM_PER_DEG_LAT * cos_lat) if cos_lat > 1e-9 else 360.0
+        if dlon >= 180:
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            lo, hi = lon - dlon, lon + dlon
+            lon_ranges = [(max(lo, -180.0), min(hi, 180.0))]
+            if lo < -180:
+                lon_ranges.append((lo + 360, 180.0))
+            if hi > 180:
+                lon_ranges.append((-180.0, hi - 360))
+
+        slices = []
+        for lat_cell in range(int(self._cell(lat_lo, -90)), int(self._cell(lat_hi, -90)) + 1):
+            for lo, hi in lon_ranges:
+                start = np.searchsorted(self._keys, self._cell_key(lat_cell, self._cell(lo, -180)), side='left')
+                stop = np.searchsorted(self._keys, self._cell_key(lat_cell, self._cell(hi, -180)), side='right')
+                if stop > start:
+                    slices.append(np.arange(start, stop))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.intp)
+
+    def within(self, lat, lon, radius_km, mask=None):
+        """(row positions, distances in km) of points within ``radius_km``, nearest first.
+
+        ``mask`` is an optional boolean array over the original rows restricting the results.
+        """
+        idx = self._candidates(lat, lon, radius_km)
+        if mask is not None:
+            idx = idx[mask[self._rows[idx]]]
+        dist = haversine(lat, lon, self._lat[idx], self._lon[idx])
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')
+        return self._rows[idx[order]], dist[order]
+
+    def nearest(self, lat, lon, k, mask=None):
+        """(row positions, distances in km) of the ``k`` nearest points, widening the search radius as needed."""
+        available = len(self) if mask is None else int(np.count_nonzero(mask[self._rows]))
+        k = min(k, available)
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            rows, dist = self.within(lat, lon, radius, mask)
+            if len(rows) >= k or radius >= np.pi * EARTH_RADIUS_KM:
+                return rows[:k], dist[:k]
+            radius *= 2
+
+
+def nearest_neighbour_path(dist_matrix, start=0):
+    n = len(dist_matrix)
+    visited = np.zeros(n, dtype=bool)
+    path = np.empty(n, dtype=np.intp)
+    current = start
+    for step in range(n):
+        path[step] = current
+        visited[current] = True
+        if step < n - 1:
+            current = int(np.argmin(np.where(visited, np.inf, dist_matrix[current])))
+    return path
+
+
+def _two_opt(D, tour, deadline):
+    """Segment reversals on a closed tour until no improving move is left or the deadline passes."""
+    m = len(tour)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(m - 2):
+            a, b = tour[i], tour[i + 1]
+            js = np.arange(i + 2, m if i else m - 1)
+            if not len(js):
+                continue
+            c, d = tour[js], tour[(js + 1) % m]
+            delta = D[a, c] + D[b, d] - D[a, b] - D[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -_EPS:
+                j = js[best]
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return tour
+
+
+def _or_opt(D, tour, deadline, max_segment=3):
+    """Move segments of 1..max_segment stops (optionally reversed) to their best position on a closed tour."""
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length <= len(tour) and time.perf_counter() < deadline:
+                m = len(tour)
+                if m - length < 3:
+                    break
+                seg = tour[i:i + length]
+                prev, nxt = tour[i - 1], tour[(i + length) % m]
+                gain = D[prev, seg[0]] + D[seg[-1], nxt] - D[prev, nxt]
+                rest = np.concatenate([tour[:i], tour[i + length:]])
+                A, B = rest, np.roll(rest, -1)
+                forward = D[A, seg[0]] + D[seg[-1], B] - D[A, B]
+                backward = D[A, seg[-1]] + D[seg[0], B] - D[A, B]
+                forward[i - 1] = backward[i - 1] = np.inf
+                k_fwd, k_bwd = int(np.argmin(forward)), int(np.argmin(backward))
+                if forward[k_fwd] <= backward[k_bwd]:
+                    k, cost, moved = k_fwd, forward[k_fwd], seg
+                else:
+                    k, cost, moved = k_bwd, backward[k_bwd], seg[::-1]
+                if cost - gain < -_EPS:
+                    tour = np.concatenate([rest[:k + 1], moved, rest[k + 1:]])
+                    improved = True
+                else:
+                    i += 1
+    return tour
+
+
+def insert_stops(dist_matrix, path, stops):
+    """Add ``stops`` to an open ``path`` one at a time at their cheapest position."""
+    path = list(path)
+    for stop in stops:
+        if not path:
+            path.append(stop)
+            continue
+        p = np.asarray(path)
+        between = dist_matrix[p[:-1], stop] + dist_matrix[stop, p[1:]] - dist_matrix[p[:-1], p[1:]]
+        costs = np.concatenate([[dist_matrix[stop, p[0]]], between, [dist_matrix[p[-1], stop]]])
+        path.insert(int(np.argmin(costs)), stop)
+    return path
+
+
+def fast_path(dist_matrix, time_budget=DEFAULT_TIME_BUDGET, initial=None):
+    """Open path by nearest-neighbour construction improved with 2-opt and Or-opt within ``time_budget`` seconds.
+
+    The open path is solved as a closed tour through a dummy stop that is 0 km from every
+    stop, so the path endpoints are free to move like any other edge. ``initial`` warm-starts
+    the improvement from a known path instead of the nearest-neighbour one.
+    """
+    n = len(dist_matrix)
+    if n <= 2:
+        return list(range(n))
+    deadline = time.perf_counter() + time_budget
+
+    D = np.zeros((n + 1, n + 1), dtype=np.float64)
+    D[1:, 1:] = dist_matrix
+    if initial is None:
+        # start from the stop farthest from the others: a natural endpoint for an open path
+        start = int(np.argmax(np.asarray(dist_matrix).sum(axis=1)))
+        initial = nearest_neighbour_path(dist_matrix, start)
+    tour = np.concatenate([[0], np.asarray(initial, dtype=np.intp) + 1])
+
+    while time.perf_counter() < deadline:
+        before = route_distance(D, np.append(tour, 0))
+        tour = _two_opt(D, tour, deadline)
+        tour = _or_opt(D, tour, deadline)
+        if route_distance(D, np.append(tour, 0)) >= before - _EPS:
+            break
+
+    dummy = int(np.flatnonzero(tour == 0)[0])
+    return (np.concatenate([tour[dummy + 1:], tour[:dummy]]) - 1).tolist()
+
+
+SOLVERS = {
+    "Fast (nearest neighbour + 2-opt)": "fast",
+    "Christofides (networkx)": "christofides",
+}
+
+
+def solve_route(dist_matrix, solver="fast", time_budget=DEFAULT_TIME_BUDGET, initial=None):
+    """Return (path, total distance in km, solve time in seconds) for the chosen solver backend."""
+    started = time.perf_counter()
+    if solver == "christofides":
+        path = christofides_path(dist_matrix)
+    else:
+        path = fast_path(dist_matrix, time_budget, initial=initial)
+    return path, route_distance(dist_matrix, path), time.perf_counter() - started
+
+
+class RouteCache:
+    """LRU cache of distance matrices and solved paths keyed by rounded coordinates and stop set.
+
+    Stops sharing rounded coordinates are routed as one point. A stop set that is not cached
+    reuses the overlapping part of the most similar cached matrix, so only rows for new points
+    are computed, and the fast solver is warm-started from that set's path with the missing
+    stops dropped and the new ones inserted at their cheapest position. With ``directory``
+    set, entries are also written there as .npz files and reloaded by other processes.
+    """
+
+    def __init__(self, max_entries=32, precision=5, directory=None, max_disk_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.precision = precision
+        self.directory = Path(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, stop_set):
+        digest = hashlib.blake2b(repr(sorted(stop_set)).encode(), digest_size=16).hexdigest()
+        return self.directory / f"route-{digest}.npz"
+
+    def _load(self, stop_set):
+        if self.directory is None:
+            return None
+        path = self._disk_path(stop_set)
+        try:
+            with np.load(path) as data:
+                keys = [tuple(k) for k in data["keys"].tolist()]
+                entry = {"keys": keys, "matrix": data["matrix"],
+                         "paths": {name[5:]: data[name].tolist() for name in data.files if name.startswith("path_")}}
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry if set(keys) == stop_set else None
+
+    def _store(self, stop_set, entry):
+        with self._lock:
+            self._entries[stop_set] = entry
+            self._entries.move_to_end(stop_set)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.directory is None:
+            return
+        from core.frame_cache import prune
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(stop_set)
+            tmp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.npz")
+            np.savez(tmp, keys=np.asarray(entry["keys"], dtype=np.float64), matrix=entry["matrix"],
+                     **{f"path_{name}": np.asarray(p, dtype=np.intp) for name, p in entry["paths"].items()})
+            os.replace(tmp, path)
+        except OSError:
+            return
+        prune(self.directory, "route-*.npz", self.max_disk_bytes)
+
+    def _lookup(self, stop_set):
+        with self._lock:
+            entry = self._entries.get(stop_set)
+            if entry is not None:
+                self._entries.move_to_end(stop_set)
+                return entry, True
+            candidates = list(self._entries.items())
+        entry = self._load(stop_set)
+        if entry is not None:
+            return entry, True
+        best = max(candidates, key=lambda item: len(stop_set & item[0]), default=None)
+        if best is None or not stop_set & best[0]:
+            return None, False
+        return best[1], False
+
+    def solve(self, lat, lon, solver="fast", time_budget=DEFAULT_TIME_BUDGET):
+        """Route the stops at (lat, lon); returns (row path, total distance in km, solve time in seconds)."""
+        started = time.perf_counter()
+        lat = np.round(np.asarray(lat, dtype=np.float64), self.precision)
+        lon = np.round(np.asarray(lon, dtype=np.float64), self.precision)
+        points, rows_of = np.unique(np.column_stack([lat, lon]), axis=0, return_inverse=True)
+        rows_of = rows_of.ravel()
+        keys = [tuple(p) for p in points.tolist()]
+        position = {key: i for i, key in enumerate(keys)}
+        stop_set = frozenset(keys)
+
+        cached, exact = self._lookup(stop_set)
+        n = len(keys)
+        matrix = np.empty((n, n), dtype=np.float64)
+        ours = np.empty(0, dtype=np.intp)
+        cached_path = None
+        if cached is not None:
+            ours = np.array([position[k] for k in cached["keys"] if k in position], dtype=np.intp)
+            theirs = np.array([i for i, k in enumerate(cached["keys"]) if k in position], dtype=np.intp)
+            matrix[np.ix_(ours, ours)] = cached["matrix"][np.ix_(theirs, theirs)]
+            if cached["paths"].get(solver) is not None:
+                cached_path = [position[cached["keys"][i]] for i in cached["paths"][solver]
+                               if cached["keys"][i] in position]
+            if exact and cached_path is not None:
+                return self._expand(cached_path, rows_of), route_distance(matrix, cached_path), time.perf_counter() - started
+
+        new = np.setdiff1d(np.arange(n), ours)
+        if len(new):
+            block = distance_matrix(points[new, 0], points[new, 1], points[:, 0], points[:, 1])
+            matrix[new, :] = block
+            matrix[:, new] = block.T
+        initial = insert_stops(matrix, cached_path, new) if cached_path is not None and solver == "fast" else None
+
+        path, distance, _ = solve_route(matrix, solver, time_budget, initial=initial)
+        paths = dict(cached["paths"]) if exact else {}
+        paths[solver] = [int(i) for i in path]
+        self._store(stop_set, {"keys": keys, "matrix": matrix, "paths": paths})
+        return self._expand(path, rows_of), distance, time.perf_counter() - started
+
+    @staticmethod
+    def _expand(path, rows_of):
+        """Turn a path over unique points into a path over the original rows (co-located rows stay together)."""
+        order = np.argsort(rows_of, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(rows_of, minlength=len(path)))])
+        return [int(r) for p in path for r in order[bounds[p]:bounds[p + 1]]]
+
+
+def cluster_stops(lat, lon, k, iterations=50, seed=0):
+    """k-means labels for stops, computed on unit-sphere vectors with k-means++ seeding."""
+    phi, lam = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    points = np.column_stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+    n = len(points)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    centers = points[[rng.integers(n)]]
+    for _ in range(1, k):
+        d2 = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+        total = d2.sum()
+        pick = rng.choice(n, p=d2 / total) if total > 0 else rng.integers(n)
+        centers = np.vstack([centers, points[pick]])
+
+    labels = np.zeros(n, dtype=np.intp)
+    for _ in range(iterations):
+        new_labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        if _ and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = points[labels == c]
+            if len(members):
+                centers[c] = members.mean(axis=0)
+    return labels
+
+
+def _solve_cluster(args):
+    lat, lon, time_budget = args
+    if len(lat) < 2:
+        return list(range(len(lat)))
+    return fast_path(distance_matrix(lat, lon), time_budget)
+
+
+def plan_itineraries(lat, lon, k, day_hours, speed_kmh=AVG_SPEED_KMH, time_budget=DEFAULT_TIME_BUDGET, workers=None):
+    """Split stops into ``k`` geographic clusters (one per rep or day) and route each one.
+
+    Clusters are solved concurrently in a process pool. Each itinerary is cut to the longest
+    prefix whose driving time fits ``day_hours``; stops beyond that are returned as unscheduled.
+    Returns ({"stops", "distance_km", "hours"} per cluster, unscheduled stop positions).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    labels = cluster_stops(lat, lon, k)
+    members = [np.flatnonzero(labels == c) for c in range(labels.max() + 1)]
+    members = [m for m in members if len(m)]
+    tasks = [(lat[m], lon[m], time_budget) for m in members]
+
+    if len(tasks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=min(len(tasks), workers or os.cpu_count())) as pool:
+            paths = list(pool.map(_solve_cluster, tasks))
+    else:
+        paths = [_solve_cluster(task) for task in tasks]
+
+    itineraries, unscheduled = [], []
+    max_km = day_hours * speed_kmh
+    for stops, path in zip(members, paths):
+        stops = stops[path]
+        legs = haversine(lat[stops[:-1]], lon[stops[:-1]], lat[stops[1:]], lon[stops[1:]])
+        fits = int(np.searchsorted(np.cumsum(legs), max_km, side='right')) + 1
+        unscheduled.extend(stops[fits:].tolist())
+        distance = float(legs[:fits - 1].sum())
+        itineraries.append({"stops": stops[:fits], "distance_km": distance, "hours": distance / speed_kmh})
+    return itineraries, np.asarray(unscheduled, dtype=np.intp)
@@ -0,0 +1,272 @@
+import difflib
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.file_lock import file_lock
+
+# Persisted name/ISIN/ticker aliases -> integer security IDs, shared by every app and run
+MASTER_DIR = Path(os.environ.get("SECURITY_MASTER_DIR", Path.home() / ".security_master"))
+FUZZY_CUTOFF = 0.92
+
+ISIN_PATTERN = re.compile(r"^[A-Z]{2}[A-Z0-9]{9}[0-9]$")
+# Applied in order to upper-cased names with punctuation already turned into spaces
+NAME_REPLACEMENTS = [
+    (r"&", " AND "),
+    (r"\bLIMITED\b", "LTD"),
+    (r"\bPRIVATE\b", "PVT"),
+    (r"\bCORPORATION\b", "CORP"),
+    (r"\bCOMPANY\b", "CO"),
+    (r"\bINDUSTRIES\b", "INDS"),
+    (r"\bINTERNATIONAL\b", "INTL"),
+    (r"^THE\s+", ""),
+]
+ALIAS_COLUMNS = ['kind', 'alias', 'security_id', 'source', 'score']
+
+
+def normalize_names(names):
+    """Match keys for security names: 'Infosys Limited.' and 'INFOSYS LTD' both become 'INFOSYS LTD'."""
+    keys = pd.Series(names, dtype=object).astype(str).str.upper()
+    keys = keys.str.replace(r"[.,'\"()\[\]\-/]", " ", regex=True)
+    for pattern, replacement in NAME_REPLACEMENTS:
+        keys = keys.str.replace(pattern, replacement, regex=True)
+    return keys.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _codes(values):
+    """Upper-cased, stripped identifiers (ISIN/ticker), with blanks as None."""
+    values = pd.Series(values, dtype=object)
+    codes = values.astype(str).str.strip().str.upper()
+    return codes.where(values.notna() & ~codes.isin(['', 'NAN', 'NONE', '-']), None)
+
+
+def _digits(key):
+    return re.findall(r"\d+", key)
+
+
+class SecurityMaster:
+    """Maps security names, ISINs and tickers to compact integer IDs through a persisted alias table.
+
+    Names are matched on ``normalize_names`` keys; an ISIN or ticker seen alongside a name links
+    them to the same ID. With ``fuzzy`` a name that still has no match is compared (difflib ratio,
+    same numbers required) with known names sharing its first word, and an accepted match is
+    stored as an alias so it is only resolved once. Unmatched securities get new IDs.
+    One instance can be shared between threads (e.g. Streamlit sessions), and instances in
+    several processes can share a directory: new IDs are only handed out under a file lock,
+    after taking in what the others saved, and are written straight away; ``save`` likewise
+    merges the on-disk tables before writing the remaining aliases.
+    """
+
+    KINDS = ('isin', 'ticker', 'name')
+
+    def __init__(self, directory=MASTER_DIR, fuzzy_cutoff=FUZZY_CUTOFF):
+        self.directory = Path(directory)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._aliases = {kind: {} for kind in self.KINDS}
+        self._rows = []
+        self._names = []
+        self._blocks = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def __len__(self):
+        return len(self._names)
+
+    def _read_tables(self):
+        try:
+            securities = pd.read_parquet(self.directory / "securities.parquet")
+            aliases = pd.read_parquet(self.directory / "aliases.parquet")
+        except (OSError, ValueError):
+            return [], []
+        names = securities.sort_values('security_id')['name'].tolist()
+        return names, list(aliases[ALIAS_COLUMNS].itertuples(index=False, name=None))
+
+    def _load(self):
+        self._names, rows = self._read_tables()
+        for kind, alias, security_id, source, score in rows:
+            self._add_alias(kind, alias, int(security_id), source, score)
+        self._dirty = False
+
+    def _file_lock(self):
+        return file_lock(self.directory / ".lock")
+
+    def _merge_saved(self):
+        """Take in the securities and aliases other processes saved since this instance read the tables."""
+        names, rows = self._read_tables()
+        # IDs are only created under the file lock and saved at once, so the saved list extends ours
+        self._names.extend(names[len(self._names):])
+        manual = {(row[0], row[1]) for row in self._rows if row[3] == 'manual'}
+        for kind, alias, security_id, source, score in rows:
+            known = self._aliases[kind].get(alias)
+            if known is None:
+                self._add_alias(kind, alias, int(security_id), source, score)
+            elif known != security_id and source == 'manual' and (kind, alias) not in manual:
+                self._drop_alias(kind, alias)
+                self._add_alias(kind, alias, int(security_id), source, score)
+
+    def save(self):
+        """Write the securities and alias tables if anything was added since the last save."""
+        with self._lock:
+            if self._dirty:
+                with self._file_lock():
+                    self._merge_saved()
+                    self._save()
+
+    def _save(self):
+        tables = {
+            "securities.parquet": pd.DataFrame({'security_id': np.arange(len(self._names), dtype=np.int32),
+                                                'name': self._names}),
+            "aliases.parquet": pd.DataFrame(self._rows, columns=ALIAS_COLUMNS),
+        }
+        for file_name, df in tables.items():
+            tmp = self.directory / f".{file_name}.{uuid.uuid4().hex}.tmp"
+            try:
+                df.to_parquet(tmp, index=False)
+                os.replace(tmp, self.directory / file_name)
+            finally:
+                tmp.unlink(missing_ok=True)
+        self._dirty = False
+
+    def _add_alias(self, kind, alias, security_id, source, score=1.0):
+        if alias is None or alias in self._aliases[kind]:
+            return
+        self._aliases[kind][alias] = security_id
+        self._rows.append((kind, alias, security_id, source, score))
+        if kind == 'name' and alias:
+            self._blocks.setdefault(self._block(alias), []).append(alias)
+        self._dirty = True
+
+    def _drop_alias(self, kind, key):
+        self._aliases[kind].pop(key, None)
+        self._rows = [row for row in self._rows if (row[0], row[1]) != (kind, key)]
+        if kind == 'name':
+            block = self._blocks.get(self._block(key), [])
+            if key in block:
+                block.remove(key)
+
+    def _known(self, key, isin, ticker):
+        return (key is None and isin is None and ticker is None) or any(
+            alias is not None and alias in self._aliases[kind]
+            for kind, alias in (('isin', isin), ('ticker', ticker), ('name', key)))
+
+    def _new_security(self, name):
+        self._names.append(name)
+        self._dirty = True
+        return len(self._names) - 1
+
+    @staticmethod
+    def _block(key):
+        # fuzzy candidates share the first word and every number (e.g. '2' in 'NIFTY 2X')
+        return key.split(' ', 1)[0], tuple(_digits(key))
+
+    def _fuzzy(self, key):
+        candidates = self._blocks.get(self._block(key), [])
+        match = difflib.get_close_matches(key, candidates, n=1, cutoff=self.fuzzy_cutoff)
+        if not match:
+            return None, None
+        return self._aliases['name'][match[0]], difflib.SequenceMatcher(None, key, match[0]).ratio()
+
+    def _resolve_one(self, name, key, isin, ticker, fuzzy):
+        for kind, alias in (('isin', isin), ('ticker', ticker), ('name', key)):
+            security_id = self._aliases[kind].get(alias) if alias else None
+            if security_id is not None:
+                break
+        else:
+            score = None
+            if fuzzy and key:
+                security_id, score = self._fuzzy(key)
+            if security_id is None:
+                security_id = self._new_security(name)
+            else:
+                self._add_alias('name', key, security_id, 'fuzzy', score)
+        # every identifier seen with this security now points at it
+        self._add_alias('isin', isin, security_id, 'linked')
+        self._add_alias('ticker', ticker, security_id, 'linked')
+        self._add_alias('name', key, security_id, 'normalized')
+        return security_id
+
+    def ids(self, names, isins=None, tickers=None, fuzzy=True):
+        """int32 security IDs for parallel arrays of names (and optionally ISINs and tickers).
+
+        Only distinct (name, ISIN, ticker) combinations are looked up, so a column of a few
+        thousand securities repeated over millions of rows costs a few thousand dict lookups.
+        """
+        columns = {'name': names, 'isin': isins, 'ticker': tickers}
+        codes, uniques = [], {}
+        for col, values in columns.items():
+            if values is not None:
+                col_codes, col_uniques = pd.factorize(pd.Series(values).reset_index(drop=True))
+                codes.append(col_codes)
+                uniques[col] = np.asarray(col_uniques, dtype=object)
+        # one int64 per row combining the per-column codes (-1 for missing shifts to 0)
+        sizes = [len(values) + 1 for values in uniques.values()]
+        combined = np.zeros(len(codes[0]), dtype=np.int64)
+        for col_codes, size in zip(codes, sizes):
+            combined = combined * size + (col_codes + 1)
+        inverse, distinct = pd.factorize(combined)
+        combos = np.empty((len(distinct), len(codes)), dtype=np.int64)
+        rest = np.asarray(distinct)
+        for position in range(len(codes) - 1, -1, -1):
+            rest, combos[:, position] = np.divmod(rest, sizes[position])
+        combos -= 1
+
+        def column(col, position):
+            if col not in uniques:
+                return [None] * len(combos)
+            picked = combos[:, position]
+            values = np.append(uniques[col], None)[np.where(picked >= 0, picked, len(uniques[col]))]
+            return list(values)
+
+        unique = pd.DataFrame({col: column(col, i) for i, col in enumerate(uniques)}, columns=['name', 'isin', 'ticker'])
+        unique['name'] = unique['name'].where(unique['name'].isna(), unique['name'].astype(str).str.strip())
+        unique['isin'] = _codes(unique['isin'])
+        unique.loc[~unique['isin'].fillna('').str.match(ISIN_PATTERN), 'isin'] = None
+        unique['ticker'] = _codes(unique['ticker'])
+        unique['key'] = normalize_names(unique['name'].fillna(''))
+        unique = unique.astype(object).where(unique.notna() & (unique != ''), None)
+
+        rows = list(unique[['name', 'isin', 'ticker', 'key']].itertuples(index=False))
+        with self._lock:
+            if all(self._known(key, isin, ticker) for _, isin, ticker, key in rows):
+                return self._resolve_all(rows, fuzzy)[inverse]
+            # something may need a new ID: pick up IDs other processes created, then save ours at once
+            with self._file_lock():
+                self._merge_saved()
+                resolved = self._resolve_all(rows, fuzzy)
+                self._save()
+        return resolved[inverse]
+
+    def _resolve_all(self, rows, fuzzy):
+        resolved = np.empty(len(rows), dtype=np.int32)
+        for i, (name, isin, ticker, key) in enumerate(rows):
+            if key is None and isin is None and ticker is None:
+                resolved[i] = -1
+                continue
+            resolved[i] = self._resolve_one(name or isin or ticker, key, isin, ticker, fuzzy)
+        return resolved
+
+    def names(self, ids):
+        """Display names (the first spelling seen) for an array of IDs; -1 gives None."""
+        lookup = np.array(self._names + [None], dtype=object)
+        ids = np.asarray(ids)
+        return lookup[np.where(ids >= 0, ids, len(self._names))]
+
+    def add_alias(self, alias, name, kind='name'):
+        """Manually point ``alias`` (a name, ISIN or ticker) at the security already known as ``name``."""
+        security_id = self.ids([name], fuzzy=False)[0]
+        key = normalize_names([alias])[0] if kind == 'name' else _codes([alias])[0]
+        with self._lock:
+            self._drop_alias(kind, key)
+            self._add_alias(kind, key, security_id, 'manual')
+        return security_id
+
+    def aliases(self):
+        df = pd.DataFrame(self._rows, columns=ALIAS_COLUMNS)
+        df['name'] = self.names(df['security_id'].to_numpy())
+        return df
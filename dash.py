@@ -1,110 +1,211 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pydeck as pdk
-import networkx as nx
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 from traceback import format_exc
+from core.dealer_map import ClusterPyramid
+from core.dealers import FilterIndex, load_dealers, workbook_sheet_names
+from core.exports import contacts_pdf, display_column
+from core.frame_cache import CACHE_DIR, upload_digest
+from core.instrumentation import app_stage_log, debug_panel
+from core.routing import (AVG_SPEED_KMH, DEFAULT_TIME_BUDGET, SOLVERS, GeoIndex, RouteCache, haversine,
+                          plan_itineraries)
 
 st.set_page_config(page_title="Dealer Directory", page_icon="📇", layout="wide")
 
 DEFAULT_AVATAR = "https://www.w3schools.com/howto/img_avatar.png"
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # Earth radius in km
-    phi1, phi2 = np.radians(lat1), np.radians(lat2)
-    dphi = np.radians(lat2 - lat1)
-    dlambda = np.radians(lon2 - lon1)
-    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
-    return 2 * R * np.arcsin(np.sqrt(a))
-
 def safe_display(val):
     return "-" if val is None or str(val).strip() == "" else str(val)
 
-def contact_card(row):
-    avatar_url = safe_display(row['Photo']) if safe_display(row['Photo']) != "-" else DEFAULT_AVATAR
-    name = safe_display(row['Name'])
-    position = safe_display(row['Position'])
-    company = safe_display(row['Company'])
-    location = safe_display(row['Location'])
-    place = safe_display(row['Place'])
-    sector = safe_display(row['Sector'])
-    email = safe_display(row['Email Address'])
-    phone = safe_display(row['Phone Number'])
-    linkedin = safe_display(row['Linkedin Link'])
+CARD_PAGE_SIZES = [12, 24, 48, 96]
+CARD_STYLE = ("background:#fff; border-radius:16px; box-shadow:0 4px 16px rgba(0,0,0,0.1); "
+              "padding:20px; min-height:430px; max-height:430px; display:flex; flex-direction:column; "
+              "justify-content:space-between; text-align:center;")
+AVATAR_STYLE = ("width:90px; height:90px; border-radius:50%; margin-bottom:12px; border:2px solid #e7e7e7; "
+                "object-fit:cover; display:block; margin-left:auto; margin-right:auto;")
+
+def contact_cards(df):
+    """HTML for one contact card per row, built column-wise rather than row by row."""
+    f = {col: display_column(df[col]) for col in ['Photo', 'Name', 'Position', 'Company', 'Location', 'Place',
+                                                   'Sector', 'Email Address', 'Phone Number', 'Linkedin Link']}
+    avatar_url = f['Photo'].where(f['Photo'] != "-", DEFAULT_AVATAR)
+    cards = (
+        f'<div style="{CARD_STYLE}">'
+        + '<img src="' + avatar_url + f'" alt="Avatar" style="{AVATAR_STYLE}">'
+        + '<div style="margin-bottom:0;"><h4 style="color:#111; margin:0;">' + f['Name']
+        + '</h4><p style="color:#666; margin:0;">' + f['Position'] + '</p></div>'
+        + '<hr style="border:none; border-top:1px solid #eee; margin:10px 0;">'
+        + '<div style="color:#111; font-size:14px; text-align:left;">'
+        + '<b>Company:</b> ' + f['Company'] + '<br>'
+        + '<b>Location:</b> ' + f['Location'] + '<br>'
+        + '<b>Place:</b> ' + f['Place'] + '<br>'
+        + '<b>Sector:</b> ' + f['Sector'] + '<br>'
+        + '<b>Email:</b> ' + f['Email Address'] + '<br>'
+        + '<b>Phone:</b> ' + f['Phone Number'] + '<br>'
+        + '<b>LinkedIn:</b> ' + f['Linkedin Link'] + '<br>'
+        + '</div></div>'
+    )
+    return cards.tolist()
 
+def show_cards(df, key="cards"):
+    n = len(df)
+    page_size = st.session_state.get(f"{key}_page_size", CARD_PAGE_SIZES[0])
+    pages = max(1, -(-n // page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    col1, col2 = st.columns([1, 3])
+    with col2:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    with col1:
+        st.selectbox("Cards per page", CARD_PAGE_SIZES, key=f"{key}_page_size")
+
+    start = (page - 1) * page_size
+    page_df = df.iloc[start:start + page_size]
+    # The whole page goes out as a single markdown block laid out by a CSS grid
     st.markdown(
-        f"""
-        <div style="background:#fff; border-radius:16px; box-shadow:0 4px 16px rgba(0,0,0,0.1);
-        padding:20px; min-height:430px; max-height:430px; display:flex; flex-direction:column; justify-content:space-between; text-align:center;">
-            <img src="{avatar_url}" alt="Avatar" style="width:90px; height:90px; border-radius:50%; margin-bottom:12px; border:2px solid #e7e7e7; object-fit:cover; display:block; margin-left:auto; margin-right:auto;">
-            <div style="margin-bottom:0;">
-                <h4 style="color:#111; margin:0;">{name}</h4>
-                <p style="color:#666; margin:0;">{position}</p>
-            </div>
-            <hr style="border:none; border-top:1px solid #eee; margin:10px 0;">
-            <div style="color:#111; font-size:14px; text-align:left;">
-                <b>Company:</b> {company}<br>
-                <b>Location:</b> {location}<br>
-                <b>Place:</b> {place}<br>
-                <b>Sector:</b> {sector}<br>
-                <b>Email:</b> {email}<br>
-                <b>Phone:</b> {phone}<br>
-                <b>LinkedIn:</b> {linkedin}<br>
-            </div>
-        </div>
-        """, unsafe_allow_html=True
+        '<div style="display:grid; grid-template-columns:repeat(3, minmax(0, 1fr)); gap:16px; margin-bottom:16px;">'
+        + "".join(contact_cards(page_df)) + '</div>',
+        unsafe_allow_html=True
+    )
+    st.caption(f"Showing {start + 1 if n else 0}-{min(start + page_size, n)} of {n} contacts")
+
+# PDFs are rendered only when the button is clicked and memoized by the filter/route state that produced them
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_pdf(state, _df, title):
+    return contacts_pdf(_df, title=title)
+
+def timed_pdf(stage_log, state, df, title):
+    with stage_log.stage("pdf", rows=len(df)):
+        return cached_pdf(state, df, title)
+
+def pdf_download_button(stage_log, state, df, title, file_name, key=None):
+    st.download_button(
+        label="Download These Contacts as PDF",
+        data=lambda: timed_pdf(stage_log, state, df, title),
+        file_name=file_name,
+        mime="application/pdf",
+        on_click="ignore",
+        key=key
     )
 
-def show_cards(df):
-    n = len(df)
-    rows = n // 3 + int(n % 3 > 0)
-    for i in range(rows):
-        cols = st.columns(3)
-        for j in range(3):
-            idx = i * 3 + j
-            if idx < n:
-                with cols[j]:
-                    contact_card(df.iloc[idx])
-
-def generate_pdf_reportlab(df, title="Dealer Directory Search Results"):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(width / 2, height - 40, title)
-    y = height - 70
-    c.setFont("Helvetica", 10)
-    line_height = 14
-    for idx, row in df.iterrows():
-        if y < 80:
-            c.showPage()
-            y = height - 40
-            c.setFont("Helvetica", 10)
-        c.drawString(40, y, f"Name: {safe_display(row['Name'])}")
-        c.drawString(300, y, f"Position: {safe_display(row['Position'])}")
-        y -= line_height
-        c.drawString(40, y, f"Company: {safe_display(row['Company'])}")
-        c.drawString(300, y, f"Location: {safe_display(row['Location'])}")
-        y -= line_height
-        c.drawString(40, y, f"Place: {safe_display(row['Place'])}")
-        c.drawString(300, y, f"Sector: {safe_display(row['Sector'])}")
-        y -= line_height
-        c.drawString(40, y, f"Email: {safe_display(row['Email Address'])}")
-        c.drawString(300, y, f"Phone: {safe_display(row['Phone Number'])}")
-        y -= line_height
-        c.drawString(40, y, f"LinkedIn: {safe_display(row['Linkedin Link'])}")
-        y -= line_height + 10
-        c.line(40, y, width - 40, y)
-        y -= 20
-    c.save()
-    buffer.seek(0)
-    return buffer.getvalue()
+ROUTE_COLORS = [[0, 0, 255], [230, 25, 75], [60, 180, 75], [245, 130, 48],
+                [145, 30, 180], [0, 150, 150], [240, 50, 230], [128, 128, 0]]
+
+def show_itineraries(stage_log, route_df, reps, day_hours, time_budget, state):
+    import pydeck as pdk
+    coords = route_df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+    with stage_log.stage("plan_itineraries", rows=len(route_df), reps=reps) as stage:
+        itineraries, unscheduled = plan_itineraries(coords[:, 0], coords[:, 1], reps, day_hours, time_budget=time_budget)
+    elapsed = stage.seconds
+
+    st.markdown("## Multi-Rep / Multi-Day Route Plan")
+    scheduled = sum(len(it['stops']) for it in itineraries)
+    st.write(f"**{len(itineraries)} itineraries** covering {scheduled} stops, "
+             f"{sum(it['distance_km'] for it in itineraries):.1f} km in total "
+             f"(at most {day_hours:g} hours of driving each, avg speed {AVG_SPEED_KMH} km/h)")
+    if len(unscheduled):
+        st.warning(f"{len(unscheduled)} stops do not fit in {day_hours:g} hours of driving and are left unscheduled.")
+    st.caption(f"Planned {len(route_df)} stops in {elapsed:.2f} s")
+
+    paths = [{"name": f"Rep/Day {i + 1}", "path": coords[it['stops']][:, ::-1].tolist(),
+              "color": ROUTE_COLORS[i % len(ROUTE_COLORS)]} for i, it in enumerate(itineraries)]
+    st.pydeck_chart(pdk.Deck(
+        map_style="mapbox://styles/mapbox/light-v9",
+        initial_view_state=pdk.ViewState(latitude=coords[:, 0].mean(), longitude=coords[:, 1].mean(), zoom=10),
+        layers=[pdk.Layer("PathLayer", data=paths, get_path="path", get_color="color",
+                          width_scale=10, width_min_pixels=4, pickable=True)],
+        tooltip={"text": "{name}"},
+    ))
+
+    for i, it in enumerate(itineraries):
+        stops_df = route_df.iloc[it['stops']]
+        hours = int(it['hours'])
+        minutes = int((it['hours'] - hours) * 60)
+        with st.expander(f"Rep/Day {i + 1}: {len(stops_df)} stops, {it['distance_km']:.1f} km, {hours} hours {minutes} minutes"):
+            st.dataframe(stops_df[['Name', 'Company', 'Place', 'Location']], hide_index=True)
+            pdf_download_button(stage_log, state + (i, tuple(it['stops'])), stops_df,
+                                title=f"Rep/Day {i + 1} Contacts (in Visit Order)", file_name=f"route_rep_day_{i + 1}.pdf", key=f"route_pdf_{i}")
+    if len(unscheduled):
+        with st.expander(f"Unscheduled: {len(unscheduled)} stops"):
+            st.dataframe(route_df.iloc[unscheduled][['Name', 'Company', 'Place', 'Location']], hide_index=True)
+
+def show_dealer_map(stage_log, df, dataset_id, mask):
+    """Filtered dealers as grid clusters sized by count, aggregated here rather than in the browser."""
+    import pydeck as pdk
+    with stage_log.stage("cluster_pyramid", rows=len(df)):
+        pyramid = load_cluster_pyramid(dataset_id, df)
+    center = pyramid.center(mask)
+    if center is None:
+        st.info("None of these contacts have coordinates.")
+        return
+    zoom = st.slider("Map Zoom", pyramid.min_zoom, pyramid.max_zoom, pyramid.fit_zoom(mask),
+                     help="Dealers are grouped into clusters about the size of a map marker at this zoom level")
+    with stage_log.stage("map_clusters", rows=len(pyramid), zoom=zoom) as stage:
+        level, clusters = pyramid.clusters(zoom, mask)
+        stage.set(clusters=len(clusters), level=level)
+    if level < zoom:
+        st.caption(f"Too many dealers for zoom {zoom}; showing the clusters of zoom {level}.")
+
+    # Only the columns the layer reads are sent: position, radius and a tooltip label per cluster
+    first = df.iloc[clusters['row']].reset_index(drop=True)
+    count = clusters['count']
+    data = pd.DataFrame({
+        'lon': clusters['lon'].astype(float).round(5),
+        'lat': clusters['lat'].astype(float).round(5),
+        'radius': (4 + 3 * np.sqrt(count)).clip(upper=40).round(1).astype(float),
+        'label': (display_column(first['Name']) + " (" + display_column(first['Company']) + ")")
+                 .where(count == 1, count.astype(str) + " dealers"),
+    })
+    st.pydeck_chart(pdk.Deck(
+        map_style="mapbox://styles/mapbox/light-v9",
+        initial_view_state=pdk.ViewState(latitude=center[0], longitude=center[1], zoom=level),
+        layers=[pdk.Layer("ScatterplotLayer", data=data, get_position=["lon", "lat"], get_radius="radius",
+                          radius_units="pixels", get_fill_color=[0, 90, 200, 160], get_line_color=[255, 255, 255],
+                          stroked=True, line_width_min_pixels=1, pickable=True)],
+        tooltip={"text": "{label}"},
+    ))
+    st.caption(f"{int(count.sum())} dealers with coordinates in {len(clusters)} clusters")
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_sheet_names(digest, _uploaded_file):
+    return workbook_sheet_names(_uploaded_file.getvalue())
+
+# Sheets are parsed in a process pool on first load, then served from the Parquet cache
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_directory(digest, _uploaded_file, selected_sheet):
+    return load_dealers(_uploaded_file.getvalue(), selected_sheet, load_sheet_names(digest, _uploaded_file),
+                        digest=digest)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_filter_index(dataset_id, _df):
+    return FilterIndex(_df)
+
+# Shared by all sessions: distance matrices and paths keyed by rounded coordinates, persisted next to the frame cache
+@st.cache_resource
+def get_route_cache():
+    return RouteCache(directory=CACHE_DIR / "routes")
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_geo_index(dataset_id, _df):
+    return GeoIndex(pd.to_numeric(_df['Latitude'], errors='coerce'), pd.to_numeric(_df['Longitude'], errors='coerce'))
+
+# Per-zoom cell codes for every dealer, built once per sheet; filters only re-count the cells
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_cluster_pyramid(dataset_id, _df):
+    return ClusterPyramid(pd.to_numeric(_df['Latitude'], errors='coerce'), pd.to_numeric(_df['Longitude'], errors='coerce'))
+
+def dealer_location(df, rows):
+    """First of ``rows`` with usable coordinates, as (row, (lat, lon)); (None, None) if there is none."""
+    lat = pd.to_numeric(df['Latitude'].iloc[rows], errors='coerce').to_numpy()
+    lon = pd.to_numeric(df['Longitude'].iloc[rows], errors='coerce').to_numpy()
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if not len(valid):
+        return None, None
+    return int(rows[valid[0]]), (float(lat[valid[0]]), float(lon[valid[0]]))
 
 def main():
     st.title("📇 Dealer Directory")
+    stage_log = app_stage_log("dash")
 
     try:
         uploaded_file = st.file_uploader("Upload Excel file", type=["xlsx"])
@@ -113,121 +214,144 @@ def main():
             return
 
         with st.spinner("Reading file..."):
-            xls = pd.ExcelFile(uploaded_file)
-            sheet_names = xls.sheet_names
+            with stage_log.stage("load_sheet_names"):
+                digest = upload_digest(uploaded_file)
+                sheet_names = load_sheet_names(digest, uploaded_file)
             selected_sheet = st.radio("Select Dealer Type", options=["All"] + sheet_names, horizontal=True)
-
-            if selected_sheet == "All":
-                df_list = []
-                for sheet in sheet_names:
-                    sheet_df = pd.read_excel(xls, sheet_name=sheet)
-                    sheet_df.columns = sheet_df.columns.str.strip()
-                    df_list.append(sheet_df)
-                df = pd.concat(df_list, ignore_index=True)
-            else:
-                df = pd.read_excel(xls, sheet_name=selected_sheet)
-                df.columns = df.columns.str.strip()
-
-            expected_cols = ['Name', 'Company', 'Location', 'Place', 'Latitude', 'Longitude',
-                             'Email Address', 'Linkedin Link', 'Phone Number', 'Position', 'Sector', 'Photo']
-            for col in expected_cols:
-                if col not in df.columns:
-                    df[col] = None
+            with stage_log.stage("read_excel", sheet=selected_sheet) as stage:
+                df = load_directory(digest, uploaded_file, selected_sheet)
+                stage.rows = len(df)
+            dataset_id = (digest, selected_sheet)
 
         st.sidebar.header("Filters & Route Planner")
-        all_names = [""] + sorted(df['Name'].dropna().astype(str).unique().tolist())
+        with stage_log.stage("filter_index", rows=len(df)):
+            index = load_filter_index(dataset_id, df)
+        all_names = [""] + index.names
         search_name = st.sidebar.selectbox("Search by Name", options=all_names)
-        company_filter = st.sidebar.multiselect("Filter by Company", options=sorted(df['Company'].dropna().unique()))
-        sector_filter = st.sidebar.multiselect("Filter by Sector", options=sorted(df['Sector'].dropna().unique()))
-        position_filter = st.sidebar.multiselect("Filter by Position", options=sorted(df['Position'].dropna().unique()))
-        location_filter = st.sidebar.multiselect("Filter by Location (City/State)", options=sorted(df['Location'].dropna().unique()))
+        company_filter = st.sidebar.multiselect("Filter by Company", options=index.options['Company'])
+        sector_filter = st.sidebar.multiselect("Filter by Sector", options=index.options['Sector'])
+        position_filter = st.sidebar.multiselect("Filter by Position", options=index.options['Position'])
+        location_filter = st.sidebar.multiselect("Filter by Location (City/State)", options=index.options['Location'])
 
         st.sidebar.markdown("---")
         st.sidebar.subheader("Optimal Route Planner")
-        route_location = st.sidebar.selectbox("Select Location for Route", options=[""] + sorted(df['Location'].dropna().unique()))
+        route_location = st.sidebar.selectbox("Select Location for Route", options=[""] + index.options['Location'])
         route_places = []
         if route_location:
             route_places = st.sidebar.multiselect("Select Places to Visit",
-                options=sorted(df[df['Location'] == route_location]['Place'].dropna().unique()))
+                options=index.places(route_location))
         calc_route = False
         if route_location and route_places:
+            route_solver = SOLVERS[st.sidebar.selectbox("Route Solver", options=list(SOLVERS))]
+            time_budget = DEFAULT_TIME_BUDGET
+            if route_solver == "fast":
+                time_budget = st.sidebar.slider("Solver Time Budget (seconds)", 0.5, 10.0, DEFAULT_TIME_BUDGET, 0.5)
+            multi_route = st.sidebar.checkbox("Split Across Reps / Days")
+            if multi_route:
+                route_reps = st.sidebar.number_input("Number of Reps / Days", min_value=2, max_value=50, value=3)
+                day_hours = st.sidebar.slider("Driving Hours per Rep / Day", 1.0, 12.0, 8.0, 0.5)
             calc_route = st.sidebar.checkbox("Calculate Route")
 
+        st.sidebar.markdown("---")
+        st.sidebar.subheader("Nearby Dealers")
+        nearby_mode = st.sidebar.selectbox("Find Dealers", options=["", "Within radius", "Nearest dealers"])
+        anchor_row = anchor = None
+        if nearby_mode:
+            anchor_type = st.sidebar.radio("Around", options=["Dealer", "Coordinates"], horizontal=True)
+            if anchor_type == "Dealer":
+                anchor_name = st.sidebar.selectbox("Dealer", options=all_names)
+                if anchor_name:
+                    anchor_row, anchor = dealer_location(df, index.name_rows(anchor_name, exact=True))
+                    if anchor is None:
+                        st.sidebar.warning("This dealer has no coordinates.")
+            else:
+                anchor = (st.sidebar.number_input("Latitude", min_value=-90.0, max_value=90.0, value=0.0, format="%.5f"),
+                          st.sidebar.number_input("Longitude", min_value=-180.0, max_value=180.0, value=0.0, format="%.5f"))
+            if nearby_mode == "Within radius":
+                nearby_size = st.sidebar.slider("Radius (km)", 1, 500, 10)
+            else:
+                nearby_size = st.sidebar.number_input("Number of dealers", min_value=1, max_value=500, value=10)
+
         with st.spinner("Filtering contacts..."):
-            filtered_df = df.copy()
-            if search_name and search_name != "":
-                filtered_df = filtered_df[filtered_df['Name'].astype(str).str.contains(search_name, case=False, na=False)]
-            if company_filter:
-                filtered_df = filtered_df[filtered_df['Company'].isin(company_filter)]
-            if sector_filter:
-                filtered_df = filtered_df[filtered_df['Sector'].isin(sector_filter)]
-            if position_filter:
-                filtered_df = filtered_df[filtered_df['Position'].isin(position_filter)]
-            if location_filter:
-                filtered_df = filtered_df[filtered_df['Location'].isin(location_filter)]
-            filtered_df = filtered_df.reset_index(drop=True)
+            filters = dict(Company=company_filter, Sector=sector_filter, Position=position_filter, Location=location_filter)
+            filter_state = (search_name,) + tuple(tuple(values) for values in filters.values())
+            with stage_log.stage("filter", rows=len(df)) as stage:
+                filtered_df = index.select(name=search_name, **filters)
+                stage.set(matches=len(filtered_df))
+
+        if nearby_mode and anchor is not None:
+            with st.spinner("Finding nearby dealers..."):
+                with stage_log.stage("geo_index", rows=len(df)):
+                    geo = load_geo_index(dataset_id, df)
+                # Results respect the sidebar filters; the anchor dealer itself is left out
+                mask = index.mask(name=search_name, **filters)
+                if anchor_row is not None:
+                    mask = np.ones(len(df), dtype=bool) if mask is None else mask
+                    mask[anchor_row] = False
+                with stage_log.stage("nearby", rows=len(df), mode=nearby_mode):
+                    if nearby_mode == "Within radius":
+                        rows, dist = geo.within(anchor[0], anchor[1], nearby_size, mask=mask)
+                        heading = f"{len(rows)} Dealers Within {nearby_size} km"
+                    else:
+                        rows, dist = geo.nearest(anchor[0], anchor[1], int(nearby_size), mask=mask)
+                        heading = f"{len(rows)} Nearest Dealers"
+                nearby_df = df.iloc[rows].reset_index(drop=True)
+                nearby_df.insert(0, 'Distance (km)', np.round(dist, 2))
+                st.markdown(f"## {heading}")
+                if len(nearby_df) == 0:
+                    st.info("No dealers with coordinates found around this point.")
+                else:
+                    st.dataframe(nearby_df[['Distance (km)', 'Name', 'Company', 'Place', 'Location']], hide_index=True)
+                    pdf_download_button(stage_log, (dataset_id, "nearby", nearby_mode, anchor, nearby_size) + filter_state, nearby_df,
+                                        title=heading, file_name="nearby_dealers.pdf")
+                    show_cards(nearby_df, key="nearby_cards")
+                return
 
         if route_location and not route_places and not calc_route:
             with st.spinner("Loading contacts for selected location..."):
-                location_contacts = df[df['Location'] == route_location]
+                location_contacts = index.select(Location=[route_location])
                 st.markdown(f"## Contacts in {safe_display(route_location)}")
                 if len(location_contacts) == 0:
                     st.info("No contacts found for this location.")
                 else:
-                    pdf_bytes = generate_pdf_reportlab(location_contacts, title=f"Contacts in {route_location}")
-                    st.download_button(
-                        label="Download These Contacts as PDF",
-                        data=pdf_bytes,
-                        file_name=f"contacts_{route_location}.pdf",
-                        mime="application/pdf"
-                    )
-                    show_cards(location_contacts)
-                st.stop()
+                    pdf_download_button(stage_log, (dataset_id, "location", route_location), location_contacts,
+                                        title=f"Contacts in {route_location}",
+                                        file_name=f"contacts_{route_location}.pdf")
+                    show_cards(location_contacts, key="location_cards")
+                return
 
         if route_location and route_places and not calc_route:
             with st.spinner("Loading contacts for selected places..."):
-                selected_contacts = df[(df['Location'] == route_location) & (df['Place'].isin(route_places))]
+                selected_contacts = index.select(Location=[route_location], Place=route_places)
                 st.markdown(f"## Contacts in Selected Places: {', '.join([safe_display(p) for p in route_places])}")
                 if len(selected_contacts) > 0:
-                    pdf_bytes = generate_pdf_reportlab(selected_contacts, title=f"Contacts in {route_location} - {', '.join([safe_display(p) for p in route_places])}")
-                    st.download_button(
-                        label="Download These Contacts as PDF",
-                        data=pdf_bytes,
-                        file_name=f"contacts_{route_location}_{'_'.join([safe_display(p) for p in route_places])}.pdf",
-                        mime="application/pdf"
-                    )
-                    show_cards(selected_contacts)
-                st.stop()
+                    pdf_download_button(stage_log, (dataset_id, "places", route_location, tuple(route_places)), selected_contacts,
+                                        title=f"Contacts in {route_location} - {', '.join([safe_display(p) for p in route_places])}",
+                                        file_name=f"contacts_{route_location}_{'_'.join([safe_display(p) for p in route_places])}.pdf")
+                    show_cards(selected_contacts, key="places_cards")
+                return
 
         if calc_route:
             with st.spinner("Calculating optimal route and preparing results..."):
                 try:
-                    route_df = df[(df['Location'] == route_location) &
-                                  (df['Place'].isin(route_places)) &
-                                  (pd.notnull(df['Latitude'])) &
-                                  (pd.notnull(df['Longitude']))].reset_index(drop=True)
+                    route_df = index.select(Location=[route_location], Place=route_places)
+                    route_df = route_df[pd.notnull(route_df['Latitude']) &
+                                        pd.notnull(route_df['Longitude'])].reset_index(drop=True)
 
                     if len(route_df) < 2:
                         st.warning("Need at least 2 valid places with coordinates for routing.")
+                    elif multi_route:
+                        show_itineraries(stage_log, route_df, int(route_reps), day_hours, time_budget,
+                                         (dataset_id, "itineraries", route_location, tuple(route_places), route_reps, day_hours))
                     else:
-                        coords = route_df[['Latitude', 'Longitude']].values
                         n = len(route_df)
-                        dist_matrix = np.zeros((n, n))
-                        for i in range(n):
-                            for j in range(n):
-                                if i != j:
-                                    dist_matrix[i, j] = haversine(coords[i][0], coords[i][1], coords[j][0], coords[j][1])
-
-                        G = nx.complete_graph(n)
-                        for i in range(n):
-                            for j in range(n):
-                                if i != j:
-                                    G[i][j]['weight'] = dist_matrix[i, j]
-
-                        tsp_path = nx.approximation.traveling_salesman_problem(G, cycle=False)
-
-                        total_distance = sum(dist_matrix[tsp_path[i], tsp_path[i+1]] for i in range(n-1))
-                        avg_speed_kmh = 40
+                        coords = route_df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+                        with stage_log.stage("route", rows=n, solver=route_solver):
+                            tsp_path, total_distance, solve_seconds = get_route_cache().solve(
+                                coords[:, 0], coords[:, 1], route_solver, time_budget)
+                        ordered = coords[tsp_path]
+                        legs = haversine(ordered[:-1, 0], ordered[:-1, 1], ordered[1:, 0], ordered[1:, 1])
+                        avg_speed_kmh = AVG_SPEED_KMH
                         total_time_hours = total_distance / avg_speed_kmh
                         hours = int(total_time_hours)
                         minutes = int((total_time_hours - hours) * 60)
@@ -235,24 +359,13 @@ def main():
                         st.markdown("## Optimal Route & Travel Time")
                         st.write(f"**Total Distance:** {total_distance:.1f} km")
                         st.write(f"**Estimated Total Time:** {hours} hours {minutes} minutes (assuming avg speed {avg_speed_kmh} km/h)")
+                        st.caption(f"Route for {n} stops solved in {solve_seconds:.2f} s")
 
-                        lines = []
-                        for i in range(len(tsp_path)-1):
-                            start_idx = tsp_path[i]
-                            end_idx = tsp_path[i+1]
-                            start = route_df.iloc[start_idx]
-                            end = route_df.iloc[end_idx]
-                            dist = dist_matrix[start_idx, end_idx]
-                            time_min = dist / avg_speed_kmh * 60
-                            lines.append({
-                                "path": [[start['Longitude'], start['Latitude']], [end['Longitude'], end['Latitude']]],
-                                "distance": dist,
-                                "time_min": time_min,
-                            })
-
+                        # the whole route is one path of [lon, lat] points rather than one object per leg
+                        import pydeck as pdk
                         path_layer = pdk.Layer(
                             "PathLayer",
-                            data=lines,
+                            data=[{"path": ordered[:, ::-1].tolist()}],
                             get_path="path",
                             get_color=[0, 0, 255],
                             width_scale=10,
@@ -270,42 +383,38 @@ def main():
                         ))
 
                         st.markdown("### Travel Times Between Places")
-                        for i, line in enumerate(lines):
-                            st.write(f"{route_df.iloc[tsp_path[i]]['Place']} → {route_df.iloc[tsp_path[i+1]]['Place']}: "
-                                     f"{line['distance']:.1f} km, approx {line['time_min']:.0f} minutes")
+                        places = route_df['Place'].iloc[tsp_path].tolist()
+                        for i, dist in enumerate(legs):
+                            st.write(f"{places[i]} → {places[i+1]}: "
+                                     f"{dist:.1f} km, approx {dist / avg_speed_kmh * 60:.0f} minutes")
 
                         st.markdown("### Contacts for Route (in Visit Order)")
-                        pdf_bytes = generate_pdf_reportlab(route_df.iloc[tsp_path], title="Contacts for Route (in Visit Order)")
-                        st.download_button(
-                            label="Download These Contacts as PDF",
-                            data=pdf_bytes,
-                            file_name="route_contacts.pdf",
-                            mime="application/pdf"
-                        )
-                        show_cards(route_df.iloc[tsp_path])
+                        pdf_download_button(stage_log, (dataset_id, "route", route_location, tuple(route_places), tuple(tsp_path)),
+                                            route_df.iloc[tsp_path], title="Contacts for Route (in Visit Order)",
+                                            file_name="route_contacts.pdf")
+                        show_cards(route_df.iloc[tsp_path], key="route_cards")
                 except Exception as e:
                     st.error("Error calculating or displaying route.")
                     st.error(str(e))
-                st.stop()
+                return
 
         with st.spinner("Rendering dashboard..."):
             st.markdown(f"## {len(filtered_df)} Contacts Found")
             if len(filtered_df) == 0:
                 st.info("No contacts found with the current filters.")
             else:
-                pdf_bytes = generate_pdf_reportlab(filtered_df, title="Dealer Directory Search Results")
-                st.download_button(
-                    label="Download These Contacts as PDF",
-                    data=pdf_bytes,
-                    file_name="search_results.pdf",
-                    mime="application/pdf"
-                )
-                show_cards(filtered_df)
+                if st.checkbox("🗺️ Show on Map"):
+                    show_dealer_map(stage_log, df, dataset_id, index.mask(name=search_name, **filters))
+                pdf_download_button(stage_log, (dataset_id, "search") + filter_state, filtered_df,
+                                    title="Dealer Directory Search Results", file_name="search_results.pdf")
+                show_cards(filtered_df, key="result_cards")
 
     except Exception as e:
         st.error("An unexpected error occurred while processing your file or inputs.")
         st.error(str(e))
         st.code(format_exc())
+    finally:
+        debug_panel(stage_log)
 
 if __name__ == "__main__":
     main()
@@ -1,86 +1,80 @@
 import streamlit as st
 import pandas as pd
-import io
-import re
+from core.exports import excel_bytes
+from core.frame_cache import cache_key, default_cache, read_csv_cached, upload_digest
+from core.holdings import (MissingColumnsError, all_schemes_report_sheets, build_scheme_index, read_schemes,
+                           scheme_report_sheets)
+from core.holdings_store import HoldingsStore, period_key
+from core.instrumentation import app_stage_log, debug_panel
 
 st.set_page_config(layout="wide", page_title="Mutual Fund Benchmark Analyzer")
 st.title("📊 Mutual Fund vs Benchmark Analyzer")
 st.markdown("Upload `schemes.csv` and `benchmarks.csv` to get started.")
 
+stage_log = app_stage_log("main")
+
 # File uploaders
 schemes_file = st.file_uploader("Upload schemes.csv", type="csv")
 benchmarks_file = st.file_uploader("Upload benchmarks.csv", type="csv")
 
-# Function to match columns using regex
-def find_column(possible_patterns, columns):
-    for col in columns:
-        for pattern in possible_patterns:
-            if re.search(pattern, col, re.IGNORECASE):
-                return col
-    return None
+@st.cache_resource(max_entries=4, show_spinner="Parsing uploaded file...")
+def load_csv(digest, _uploaded_file, skiprows):
+    return read_csv_cached(_uploaded_file.getvalue(), digest=digest, encoding='ISO-8859-1', skiprows=skiprows)
 
-if schemes_file and benchmarks_file:
-    # Read CSVs
-    schemes_df = pd.read_csv(schemes_file, encoding='ISO-8859-1', skiprows=1)
-    benchmarks_df = pd.read_csv(benchmarks_file, encoding='ISO-8859-1', skiprows=2)
-
-    # Get actual column names
-    actual_cols = schemes_df.columns.tolist()
-
-    # Find key columns
-    scheme_col = find_column(["scheme"], actual_cols)
-    stock_col = find_column(["security", "stock"], actual_cols)
-    industry_col = find_column(["industry"], actual_cols)
-    fund_weight_col = find_column(["% of holdings", "fund weight", "scheme weight"], actual_cols)
-    benchmark_weight_col = find_column(["benchmark weight", "index weight", "nifty weight"], actual_cols)
-    active_weight_col = find_column(["active weight"], actual_cols)
-
-    # Error handling if any column is not found
-    missing = []
-    if not scheme_col: missing.append("Scheme Name")
-    if not stock_col: missing.append("Stock Name")
-    if not industry_col: missing.append("Industry")
-    if not fund_weight_col: missing.append("Fund Weight")
-    if not benchmark_weight_col: missing.append("Benchmark Weight")
-    if not active_weight_col: missing.append("Active Weight")
-
-    if missing:
-        st.error(f"❌ Missing columns in your CSV: {', '.join(missing)}")
-        st.write("Detected columns:", actual_cols)
-        st.stop()
+# Only the detected columns are kept: names as categoricals, weights as float32, read in chunks
+@st.cache_resource(max_entries=4, show_spinner="Parsing schemes.csv...")
+def load_schemes(digest, _uploaded_file):
+    return default_cache.get_or_build(
+        cache_key(digest, "read_schemes", 1),
+        lambda: read_schemes(_uploaded_file.getvalue(), skiprows=1, encoding='ISO-8859-1'))
 
-    # Rename columns
-    schemes_df = schemes_df.rename(columns={
-        scheme_col: 'Scheme Name',
-        stock_col: 'Stock Name',
-        industry_col: 'Industry',
-        fund_weight_col: 'Fund Weight',
-        benchmark_weight_col: 'Benchmark Weight',
-        active_weight_col: 'Active Weight'
-    })
+@st.cache_resource(max_entries=4, show_spinner="Indexing schemes...")
+def load_scheme_index(digest, _schemes_df):
+    return build_scheme_index(_schemes_df)
 
-    # Convert weight columns to numeric
-    for col in ['Fund Weight', 'Benchmark Weight', 'Active Weight']:
-        schemes_df[col] = pd.to_numeric(schemes_df[col], errors='coerce')
+# Excel reports are written only when a download button is clicked, with openpyxl's streaming
+# write-only workbook, and kept per file and scheme for repeat downloads
+@st.cache_data(max_entries=32, show_spinner=False)
+def scheme_report(digest, scheme, _summary):
+    return excel_bytes(scheme_report_sheets(_summary))
 
-    # Drop missing essentials
-    schemes_df = schemes_df.dropna(subset=['Scheme Name', 'Stock Name', 'Industry'])
+@st.cache_data(max_entries=2, show_spinner=False)
+def all_schemes_report(digest, _scheme_index):
+    return excel_bytes(all_schemes_report_sheets(_scheme_index))
 
-    # Dropdown for scheme
-    scheme_names = schemes_df['Scheme Name'].dropna().unique()
-    selected_scheme = st.selectbox("Select a Scheme", scheme_names)
+# Monthly history shared by all sessions, under HOLDINGS_STORE_DIR
+@st.cache_resource
+def get_holdings_store():
+    return HoldingsStore()
+
+def timed_export(name, rows, build):
+    with stage_log.stage(name, rows=rows):
+        return build()
 
-    filtered = schemes_df[schemes_df['Scheme Name'] == selected_scheme]
+if schemes_file and benchmarks_file:
+    # Read CSVs (parsed, renamed and type-coerced once per file content)
+    try:
+        with stage_log.stage("load_schemes") as stage:
+            schemes_df = load_schemes(upload_digest(schemes_file), schemes_file)
+            stage.rows = len(schemes_df)
+    except MissingColumnsError as e:
+        # Error handling if any column is not found
+        st.error(f"❌ Missing columns in your CSV: {', '.join(e.missing)}")
+        st.write("Detected columns:", e.columns)
+        st.stop()
+    with stage_log.stage("load_benchmarks") as stage:
+        benchmarks_df = load_csv(upload_digest(benchmarks_file), benchmarks_file, skiprows=2)
+        stage.rows = len(benchmarks_df)
 
-    # Group by Industry
-    industry_fund = filtered.groupby('Industry')['Fund Weight'].sum().reset_index()
-    industry_benchmark = filtered.groupby('Industry')['Benchmark Weight'].sum().reset_index()
-    industry_summary = pd.merge(industry_fund, industry_benchmark, on='Industry', how='outer').fillna(0)
-    industry_summary['Active Weight'] = industry_summary['Fund Weight'] - industry_summary['Benchmark Weight']
+    # Per-scheme industry summary and top 10 over/underweight stocks for every scheme, built once per file
+    with stage_log.stage("scheme_index", rows=len(schemes_df)) as stage:
+        scheme_index = load_scheme_index(upload_digest(schemes_file), schemes_df)
+        stage.set(schemes=len(scheme_index))
 
-    # Top 10 Overweight & Underweight Stocks
-    top_over = filtered.sort_values('Active Weight', ascending=False).dropna(subset=['Active Weight']).head(10)
-    top_under = filtered.sort_values('Active Weight', ascending=True).dropna(subset=['Active Weight']).head(10)
+    # Dropdown for scheme
+    selected_scheme = st.selectbox("Select a Scheme", list(scheme_index))
+    summary = scheme_index[selected_scheme]
+    industry_summary, top_over, top_under = summary
 
     # Display summary
     st.subheader("📘 Industry-wise Summary")
@@ -94,18 +88,62 @@ if schemes_file and benchmarks_file:
         st.subheader("🟥 Top 10 Underweight Stocks")
         st.dataframe(top_under[['Stock Name', 'Active Weight']])
 
-    # Download Excel Report
-    def to_excel():
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            industry_summary.to_excel(writer, index=False, sheet_name='Industry Summary')
-            top_over.to_excel(writer, index=False, sheet_name='Top Overweight')
-            top_under.to_excel(writer, index=False, sheet_name='Top Underweight')
-        output.seek(0)
-        return output
-
-    st.download_button("📥 Download Excel Report", data=to_excel(),
-                       file_name="Mutual_Fund_Report.xlsx", mime="application/vnd.ms-excel")
+    # Download Excel Reports
+    digest = upload_digest(schemes_file)
+    report_rows = len(industry_summary) + len(top_over) + len(top_under)
+    st.download_button("📥 Download Excel Report",
+                       data=lambda: timed_export("to_excel", report_rows,
+                                                 lambda: scheme_report(digest, selected_scheme, summary)),
+                       file_name="Mutual_Fund_Report.xlsx", mime="application/vnd.ms-excel", on_click="ignore")
+    st.download_button("📚 Download All Schemes Report",
+                       data=lambda: timed_export("to_excel_all_schemes", len(schemes_df),
+                                                 lambda: all_schemes_report(digest, scheme_index)),
+                       file_name="Mutual_Fund_Report_All_Schemes.xlsx", mime="application/vnd.ms-excel",
+                       on_click="ignore")
+
+    # Month-over-month turnover, entries/exits and active-weight drift from stored snapshots
+    st.subheader("🗓️ Month-over-Month History")
+    store = get_holdings_store()
+    period = st.text_input("Disclosure Month (YYYY-MM)", value=str(pd.Period.now('M') - 1))
+    if st.button("Add This Upload to History"):
+        try:
+            period = period_key(period)
+        except ValueError:
+            st.error(f"❌ Could not read a month from '{period}'. Use YYYY-MM, e.g. 2025-01.")
+        else:
+            with stage_log.stage("history_append", rows=len(schemes_df), period=period):
+                store.append(period, schemes_df, benchmarks_df,
+                             source=f"{upload_digest(schemes_file)}-{upload_digest(benchmarks_file)}")
+            st.success(f"Stored holdings for {period}.")
+
+    periods = store.periods()
+    if len(periods) < 2:
+        st.info("Add at least two months to see month-over-month changes."
+                + (f" Stored so far: {', '.join(periods)}." if periods else ""))
+    else:
+        with stage_log.stage("history_summary", periods=len(periods)):
+            history = store.summary([selected_scheme])
+        st.line_chart(history.set_index('Period')[['Turnover (%)', 'Active Drift (%)']].astype(float))
+        st.dataframe(history.drop(columns='Scheme Name'), hide_index=True)
+
+        change_period = st.selectbox("Show Changes for Month", periods[:0:-1])
+        changes = store.changes(change_period, scheme=selected_scheme)
+        if changes is not None:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**New positions**")
+                st.dataframe(changes[changes['Status'] == 'Entry'][['Stock Name', 'Fund Weight', 'Active Weight']],
+                             hide_index=True)
+            with col2:
+                st.markdown("**Exited positions**")
+                st.dataframe(changes[changes['Status'] == 'Exit'][['Stock Name', 'Previous Weight', 'Previous Active Weight']],
+                             hide_index=True)
+            st.markdown("**Largest active-weight moves**")
+            moves = changes.reindex(changes['Active Weight Change'].abs().sort_values(ascending=False).index).head(10)
+            st.dataframe(moves[['Stock Name', 'Status', 'Previous Active Weight', 'Active Weight', 'Active Weight Change']],
+                         hide_index=True)
 
 else:
     st.info("Please upload both files to begin analysis.")
+
+debug_panel(stage_log)
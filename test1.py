@@ -1,22 +1,88 @@
 import streamlit as st
 import pandas as pd
+from core.active_weights import active_weights
+from core.exports import csv_bytes
+from core.frame_cache import cache_key, default_cache, upload_digest
+from core.holdings import read_csv_chunked, read_header
+from core.instrumentation import app_stage_log, debug_panel
+from core.overlap import HoldingsMatrix, overlap_pairs
+from core.security_master import SecurityMaster
 
 st.title("📊 Flexible Mutual Fund vs Benchmark Comparison")
 
+stage_log = app_stage_log("test1")
+
 # Upload files
 schemes_file = st.file_uploader("📄 Upload schemes.csv", type="csv")
 benchmarks_file = st.file_uploader("📄 Upload benchmarks.csv", type="csv")
 
-if schemes_file and benchmarks_file:
-    schemes_df = pd.read_csv(schemes_file, skiprows=1, encoding="ISO-8859-1", low_memory=False)
-    benchmarks_df = pd.read_csv(benchmarks_file, skiprows=2, encoding="ISO-8859-1", low_memory=False)
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_header(digest, _uploaded_file, skiprows):
+    return read_header(_uploaded_file.getvalue(), skiprows=skiprows, encoding="ISO-8859-1")
+
+# Only the selected columns are read, in chunks: names as categoricals, weights as float32
+@st.cache_resource(max_entries=8, show_spinner="Parsing uploaded file...")
+def load_columns(digest, _uploaded_file, skiprows, names, weights):
+    return default_cache.get_or_build(
+        cache_key(digest, "read_csv_chunked", skiprows, names, weights),
+        lambda: read_csv_chunked(_uploaded_file.getvalue(), usecols=names + weights,
+                                 categorical=names, numeric=weights,
+                                 skiprows=skiprows, encoding="ISO-8859-1"))
+
+# Stock names, and ISINs when an ISIN column is picked, become integer security IDs through the
+# persisted security master ("LTD" and "LIMITED" spellings match), once per file and column choice
+@st.cache_resource
+def get_security_master():
+    return SecurityMaster()
+
+@st.cache_resource(max_entries=8, show_spinner="Matching securities...")
+def load_security_ids(digest, _df, stock_col, isin_col):
+    master = get_security_master()
+    ids = master.ids(_df[stock_col], isins=_df[isin_col] if isin_col else None)
+    master.save()
+    return ids
+
+def isin_column_index(columns):
+    matches = [i for i, col in enumerate(columns) if 'isin' in col.lower()]
+    return matches[0] + 1 if matches else 0
+
+# The comparison CSV is encoded only when the download button is clicked, once per selection
+@st.cache_data(max_entries=32, show_spinner=False)
+def comparison_csv(selection, _merged):
+    with stage_log.stage("to_csv", rows=len(_merged)):
+        return csv_bytes(_merged)
+
+# Every scheme at once: a sparse scheme x stock matrix, active share against each benchmark and
+# pairwise overlap, computed once per file/column selection
+@st.cache_resource(max_entries=2, show_spinner="Comparing all schemes...")
+def load_overlap(selection, _schemes_df, _scheme_ids, _benchmarks_df, _benchmark_ids, normalize):
+    _, _, scheme_name_col, _, scheme_weight_col, benchmark_filter_col, _, benchmark_weight_col = selection[:8]
+    matrix = HoldingsMatrix(_schemes_df[scheme_name_col], _scheme_ids, _schemes_df[scheme_weight_col], normalize=normalize)
+    active_share = matrix.active_share_table(_benchmarks_df[benchmark_filter_col], _benchmark_ids,
+                                             _benchmarks_df[benchmark_weight_col], normalize=normalize)
+    return matrix, active_share, matrix.overlap()
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def overlap_csv(selection, normalize, min_overlap, _matrix, _overlap):
+    with stage_log.stage("to_csv_overlap", rows=len(_matrix.schemes)):
+        return csv_bytes(overlap_pairs(_matrix, _overlap, min_overlap))
+
+if schemes_file and benchmarks_file:
     st.subheader("🔧 Column Selection for Scheme File")
-    scheme_cols = schemes_df.columns.tolist()
+    scheme_cols = load_header(upload_digest(schemes_file), schemes_file, skiprows=1)
 
     scheme_name_col = st.selectbox("Scheme Name Column", scheme_cols)
     scheme_stock_col = st.selectbox("Stock Name Column", scheme_cols, index=4)
     scheme_weight_col = st.selectbox("Scheme Weight (%) Column", scheme_cols, index=9)
+    scheme_isin_col = st.selectbox("Scheme ISIN Column (optional)", [""] + scheme_cols, index=isin_column_index(scheme_cols))
+
+    with stage_log.stage("load_schemes") as stage:
+        schemes_df = load_columns(upload_digest(schemes_file), schemes_file, skiprows=1,
+                                  names=(scheme_name_col, scheme_stock_col) + ((scheme_isin_col,) if scheme_isin_col else ()),
+                                  weights=(scheme_weight_col,))
+        stage.rows = len(schemes_df)
+    with stage_log.stage("security_ids", rows=len(schemes_df)):
+        scheme_ids = load_security_ids(upload_digest(schemes_file), schemes_df, scheme_stock_col, scheme_isin_col)
 
     scheme_list = schemes_df[scheme_name_col].dropna().unique()
     selected_scheme = st.selectbox("🔽 Select a Mutual Fund Scheme", scheme_list)
@@ -24,18 +90,31 @@ if schemes_file and benchmarks_file:
     filtered_scheme = schemes_df[schemes_df[scheme_name_col] == selected_scheme]
 
     st.subheader("🔧 Column Selection for Benchmark File")
-    benchmark_cols = benchmarks_df.columns.tolist()
+    benchmark_cols = load_header(upload_digest(benchmarks_file), benchmarks_file, skiprows=2)
 
     benchmark_name = st.text_input("Enter Benchmark Name (e.g., BSE500)", value="BSE500")
     benchmark_filter_col = st.selectbox("Benchmark Name Column", benchmark_cols, index=3)
     benchmark_stock_col = st.selectbox("Benchmark Stock Name Column", benchmark_cols, index=4)
     benchmark_weight_col = st.selectbox("Benchmark Weight (%) Column", benchmark_cols, index=9)
+    benchmark_isin_col = st.selectbox("Benchmark ISIN Column (optional)", [""] + benchmark_cols,
+                                      index=isin_column_index(benchmark_cols))
+
+    with stage_log.stage("load_benchmarks") as stage:
+        benchmarks_df = load_columns(upload_digest(benchmarks_file), benchmarks_file, skiprows=2,
+                                     names=(benchmark_filter_col, benchmark_stock_col)
+                                     + ((benchmark_isin_col,) if benchmark_isin_col else ()),
+                                     weights=(benchmark_weight_col,))
+        stage.rows = len(benchmarks_df)
+    with stage_log.stage("security_ids", rows=len(benchmarks_df)):
+        benchmark_ids = load_security_ids(upload_digest(benchmarks_file), benchmarks_df, benchmark_stock_col,
+                                          benchmark_isin_col)
 
     if not filtered_scheme.empty:
         # Scheme holdings
         scheme_holdings = filtered_scheme[[scheme_stock_col, scheme_weight_col]]
         scheme_holdings.columns = ['Stock', 'Scheme_Weight']
         scheme_holdings['Stock'] = scheme_holdings['Stock'].astype(str).str.upper()
+        scheme_holdings['Security ID'] = scheme_ids[schemes_df.index.get_indexer(filtered_scheme.index)]
         scheme_holdings['Scheme_Weight'] = pd.to_numeric(scheme_holdings['Scheme_Weight'], errors='coerce')
 
         # Benchmark holdings
@@ -43,11 +122,14 @@ if schemes_file and benchmarks_file:
         benchmark_holdings = benchmark_filtered[[benchmark_stock_col, benchmark_weight_col]]
         benchmark_holdings.columns = ['Stock', 'Benchmark_Weight']
         benchmark_holdings['Stock'] = benchmark_holdings['Stock'].astype(str).str.upper()
+        benchmark_holdings['Security ID'] = benchmark_ids[benchmarks_df.index.get_indexer(benchmark_filtered.index)]
         benchmark_holdings['Benchmark_Weight'] = pd.to_numeric(benchmark_holdings['Benchmark_Weight'], errors='coerce')
 
         # Merge and calculate
-        merged = pd.merge(scheme_holdings, benchmark_holdings, on='Stock', how='outer').fillna(0)
-        merged['Active_Weight'] = merged['Scheme_Weight'] - merged['Benchmark_Weight']
+        with stage_log.stage("active_weights", rows=len(scheme_holdings) + len(benchmark_holdings)):
+            # joined on security ID, so differently spelled names of one stock line up
+            scheme_holdings.insert(0, 'Scheme', selected_scheme)
+            merged = active_weights(scheme_holdings, benchmark_holdings).drop(columns='Scheme')
 
         # Results
         st.subheader("📉 Top 5 Underacquired Stocks")
@@ -59,7 +141,53 @@ if schemes_file and benchmarks_file:
         st.dataframe(over[['Stock', 'Active_Weight']])
 
         # Download
-        csv = merged.to_csv(index=False).encode('utf-8')
-        st.download_button("⬇️ Download Full CSV", data=csv, file_name="scheme_vs_benchmark_comparison.csv")
+        selection = (upload_digest(schemes_file), upload_digest(benchmarks_file), scheme_name_col, scheme_stock_col,
+                     scheme_weight_col, selected_scheme, benchmark_filter_col, benchmark_stock_col, benchmark_weight_col, benchmark_name,
+                     scheme_isin_col, benchmark_isin_col)
+        st.download_button("⬇️ Download Full CSV", data=lambda: comparison_csv(selection, merged),
+                           file_name="scheme_vs_benchmark_comparison.csv", on_click="ignore")
     else:
         st.warning("❌ No data found for the selected scheme.")
+
+    st.subheader("🧭 All Schemes: Active Share & Overlap")
+    if st.checkbox("Compare all schemes (active share against every benchmark, pairwise overlap)"):
+        normalize = st.checkbox("Rescale each portfolio to 100% (ignore cash and unlisted lines)", value=True)
+        all_selection = (upload_digest(schemes_file), upload_digest(benchmarks_file), scheme_name_col, scheme_stock_col,
+                         scheme_weight_col, benchmark_filter_col, benchmark_stock_col, benchmark_weight_col, scheme_isin_col,
+                         benchmark_isin_col)
+        with stage_log.stage("overlap", rows=len(schemes_df), normalize=normalize) as stage:
+            matrix, active_share, overlap = load_overlap(all_selection, schemes_df, scheme_ids, benchmarks_df, benchmark_ids,
+                                                          normalize)
+            stage.set(schemes=len(matrix.schemes), benchmarks=active_share.shape[1])
+
+        st.markdown("**Active share (%)** — half the sum of absolute weight differences; low values suggest closet indexing")
+        benchmark_options = list(active_share.columns)
+        as_benchmark = st.selectbox("Active Share Against", benchmark_options,
+                                    index=benchmark_options.index(benchmark_name) if benchmark_name in benchmark_options else 0)
+        closet_threshold = st.slider("Closet Indexer Threshold (% active share)", 0, 100, 60)
+        if as_benchmark is not None:
+            closet = active_share[as_benchmark].sort_values()
+            closet = closet[closet < closet_threshold]
+            st.write(f"**{len(closet)} of {len(active_share)} schemes** have under {closet_threshold}% active share against {as_benchmark}")
+            st.dataframe(closet.round(2).rename('Active Share (%)'))
+        st.dataframe(active_share.round(2))
+        st.download_button("⬇️ Download Active Share CSV",
+                           data=lambda: csv_bytes(active_share.round(4).reset_index()),
+                           file_name="active_share.csv", on_click="ignore")
+
+        st.markdown("**Portfolio overlap (%)** — for each pair of schemes, the sum over common stocks of the smaller weight")
+        min_overlap = st.slider("Minimum Overlap (%)", 0, 100, 50)
+        if selected_scheme in set(matrix.schemes):
+            row = overlap[matrix.schemes.get_loc(selected_scheme)]
+            similar = (pd.Series(row, index=matrix.schemes, name='Overlap (%)').drop(selected_scheme)
+                       .sort_values(ascending=False).head(10).round(2))
+            st.write(f"Schemes overlapping most with **{selected_scheme}**")
+            st.dataframe(similar)
+        pairs = overlap_pairs(matrix, overlap, min_overlap)
+        st.write(f"**{len(pairs)} scheme pairs** overlap by at least {min_overlap}%")
+        st.dataframe(pairs.head(1000), hide_index=True)
+        st.download_button("⬇️ Download Overlapping Pairs CSV",
+                           data=lambda: overlap_csv(all_selection, normalize, min_overlap, matrix, overlap),
+                           file_name="scheme_overlap.csv", on_click="ignore")
+
+debug_panel(stage_log)